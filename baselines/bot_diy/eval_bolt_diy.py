@@ -1,12 +1,10 @@
-import json
 import os
+import orjson
 from argparse import ArgumentParser
 
-# Import the function from remove_node_modules.py
-from automatic_web_gen import automatic_web_gen
-from remove_invalid_through_extract import process_directory
-
-fullstack_prompt_template = """Create a website repository based on the given user instruction with these rules: 1. If the site needs dynamic data, include:   - A frontend that fetches all data from backend APIs. No hard-coded or mock data is allowed.   - A backend that connects to an external PostgreSQL database using these exact environment variables:  DB_HOST=localhost, DB_PORT=5432, DB_USERNAME=myappuser, DB_PASSWORD=myapppassword, DB_NAME=myapp. Every data operation must hit this database.    2. If the site is strictly static (e.g., marketing or documentation), a backend is not required.    3. Configure the repository's `package.json` file so that the command `npm run install:all` can install dependencies for both the frontend and the backend, and `npm run dev` can concurrently start the frontend and the backend services.    user instruction: {instruction}"""
+# constant prefix; the per-record prompt is prefix + instruction, so no
+# str.format parsing runs inside the loop
+fullstack_prompt_prefix = """Create a website repository based on the given user instruction with these rules: 1. If the site needs dynamic data, include:   - A frontend that fetches all data from backend APIs. No hard-coded or mock data is allowed.   - A backend that connects to an external PostgreSQL database using these exact environment variables:  DB_HOST=localhost, DB_PORT=5432, DB_USERNAME=myappuser, DB_PASSWORD=myapppassword, DB_NAME=myapp. Every data operation must hit this database.    2. If the site is strictly static (e.g., marketing or documentation), a backend is not required.    3. Configure the repository's `package.json` file so that the command `npm run install:all` can install dependencies for both the frontend and the backend, and `npm run dev` can concurrently start the frontend and the backend services.    user instruction: """
 
 def main():
     parser = ArgumentParser(description="Process JSONL file and generate web content.")
@@ -16,6 +14,11 @@ def main():
     parser.add_argument("--url", default="http://localhost:5173/", help="bolt.diy url")
     parser.add_argument("--tag", default="", help="bolt.diy url")
     args = parser.parse_args()
+
+    # Defer the heavy Selenium-backed imports until argparse has succeeded
+    from automatic_web_gen import automatic_web_gen
+    from remove_invalid_through_extract import process_directory
+
     # Adjust these if you want different defaults
     provider = args.provider
     desired_model = args.desired_model
@@ -32,16 +35,16 @@ def main():
 
     idx = 1
     # Read the JSONL file line by line
-    with open(jsonl_path, "r", encoding="utf-8") as f:
+    with open(jsonl_path, "rb") as f:
         for line in f:
             line = line.strip()
             if not line:
                 continue  # Skip empty lines if any
 
-            record = json.loads(line)
+            record = orjson.loads(line)
             instruction = record.get("instruction", "")
             
-            prompt = fullstack_prompt_template.format(instruction=instruction)
+            prompt = fullstack_prompt_prefix + instruction
 
             # Call automatic_web_gen for each record
             automatic_web_gen(
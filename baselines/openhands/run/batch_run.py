@@ -1,23 +1,24 @@
 import os
 import platform
-import time
-import json
-from tqdm import tqdm
+import threading
+import functools
+import orjson
+import asyncio
+from tqdm.asyncio import tqdm_asyncio
 from dotenv import load_dotenv
 load_dotenv()
 
-from pydantic import SecretStr
+try:
+    # faster event loop for the Docker/LLM-bound driver; unix-only
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
 
-from openhands.sdk import (
-    LLM,
-    Conversation,
-    RemoteConversation,
-    get_logger,
-)
-from openhands.tools.preset.default import get_default_agent
-from openhands.workspace import DockerWorkspace
+import subprocess, shutil
 
-import subprocess, pathlib
+from aiolimiter import AsyncLimiter
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 
 # ensure host dir is writable BEFORE starting Docker
 WORKSPACE_ROOT = "baselines/openhands/workspaces_root"
@@ -27,132 +28,271 @@ RUN_NAME = f"Openhands_{os.getenv('LLM_MODEL').replace('\\', '-')}_iter{MAX_ITER
 RUN_DIR = os.path.join(WORKSPACE_ROOT, RUN_NAME)
 TEST_FILE = "data/FullStack-Bench.jsonl"
 LOG_FILE = os.path.join(RUN_DIR, "log.jsonl")
+# each sample gets its own mount_dir/docker stack, so they can run concurrently
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "4"))
 
-logger = get_logger(__name__)
+# cap how fast new agent sessions launch so the backend is not hammered
+SESSIONS_PER_MINUTE = int(os.getenv("SESSIONS_PER_MINUTE", "10"))
 
-# 1) Ensure we have LLM API key
-api_key = os.getenv("LLM_API_KEY")
-assert api_key is not None, "LLM_API_KEY environment variable is not set."
+# static rules shared by every sample; only the instruction varies
+FULLSTACK_PROMPT_PREFIX = """Create a website repository based on the given user instruction with these rules: 1. If the site needs dynamic data, include:   - A frontend that fetches all data from backend APIs. No hard-coded or mock data is allowed.   - A backend that connects to an external PostgreSQL database using these exact environment variables:  DB_HOST=localhost, DB_PORT=5432, DB_USERNAME=myappuser, DB_PASSWORD=myapppassword, DB_NAME=myapp. Every data operation must hit this database.    2. If the site is strictly static (e.g., marketing or documentation), a backend is not required.    3. Configure the repository's `package.json` file so that the command `npm run install:all` can install dependencies for both the frontend and the backend, and `npm run dev` can concurrently start the frontend and the backend services.    user instruction: """
 
-llm = LLM(
-    usage_id="agent",
-    model=os.getenv("LLM_MODEL"),
-    base_url=os.getenv("LLM_BASE_URL"),
-    api_key=SecretStr(api_key),
-)
+@functools.lru_cache(maxsize=1)
+def get_llm():
+    """Construct the LLM lazily so importing this module stays cheap."""
+    from pydantic import SecretStr
+    from openhands.sdk import LLM
+
+    # 1) Ensure we have LLM API key
+    api_key = os.getenv("LLM_API_KEY")
+    assert api_key is not None, "LLM_API_KEY environment variable is not set."
+
+    return LLM(
+        usage_id="agent",
+        model=os.getenv("LLM_MODEL"),
+        base_url=os.getenv("LLM_BASE_URL"),
+        api_key=SecretStr(api_key),
+    )
 
 
 def load_jsonl(in_file):
-    datas = []
-    with open(in_file, "r", encoding="utf-8") as f:
+    # stream records instead of materializing the whole file
+    with open(in_file, "rb") as f:
         for line in f:
-            datas.append(json.loads(line))
-    return datas
+            if line.strip():
+                yield orjson.loads(line)
 
 
 def save_jsonl(datas, out_file, mode="w"):
     with open(out_file, mode, encoding="utf-8") as f:
         for data in datas:
-            f.write(json.dumps(data) + "\n")
+            f.write(orjson.dumps(data).decode() + "\n")
 
 
-def detect_platform():
-    """Detects the correct Docker platform string."""
-    machine = platform.machine().lower()
-    if "arm" in machine or "aarch64" in machine:
-        return "linux/arm64"
-    return "linux/amd64"
+# Docker platform string is invariant for the whole run, so compute it once
+_MACHINE = platform.machine().lower()
+_DOCKER_PLATFORM = (
+    "linux/arm64" if ("arm" in _MACHINE or "aarch64" in _MACHINE) else "linux/amd64"
+)
 
 
-def process_single(mount_dir, instruction):
-    if not os.path.exists(mount_dir):
-        os.makedirs(mount_dir, exist_ok=True)
-    host_dir = pathlib.Path(mount_dir)
-    if host_dir.exists():
-        # change to uid/gid 1000 which is what the image uses
-        subprocess.run(["sudo", "chown", "-R", "10001:10001", str(host_dir)], check=True)
-    postgres_host_dir = os.path.join(mount_dir, "db")
+def open_workspace(mount_dir):
+    """Start a long-lived DockerWorkspace rooted at mount_dir."""
+    # heavy SDK import deferred until a workspace is actually needed
+    from openhands.workspace import DockerWorkspace
 
-    # create prompt
-    fullstack_prompt_template = """Create a website repository based on the given user instruction with these rules: 1. If the site needs dynamic data, include:   - A frontend that fetches all data from backend APIs. No hard-coded or mock data is allowed.   - A backend that connects to an external PostgreSQL database using these exact environment variables:  DB_HOST=localhost, DB_PORT=5432, DB_USERNAME=myappuser, DB_PASSWORD=myapppassword, DB_NAME=myapp. Every data operation must hit this database.    2. If the site is strictly static (e.g., marketing or documentation), a backend is not required.    3. Configure the repository's `package.json` file so that the command `npm run install:all` can install dependencies for both the frontend and the backend, and `npm run dev` can concurrently start the frontend and the backend services.    user instruction: {instruction}"""
-    prompt = fullstack_prompt_template.format(instruction=instruction)
+    os.makedirs(mount_dir, exist_ok=True)
+    # change to uid/gid 10001 which is what the image uses; a freshly created
+    # dir is empty, so the recursive chown can be skipped entirely then
+    if any(os.scandir(mount_dir)):
+        try:
+            for dirpath, _dirnames, filenames in os.walk(mount_dir):
+                os.chown(dirpath, 10001, 10001)
+                for name in filenames:
+                    os.chown(os.path.join(dirpath, name), 10001, 10001)
+        except PermissionError:
+            # not running as root, fall back to one sudo chown
+            subprocess.run(["sudo", "chown", "-R", "10001:10001", mount_dir], check=True)
+    postgres_host_dir = os.path.join(mount_dir, "db")
 
-    with DockerWorkspace(
+    workspace = DockerWorkspace(
         # use pre-built image for faster startup
         server_image="luzimu/openhands-postgres:latest",
         bind_mounts=[
             f"{postgres_host_dir}:/var/lib/postgresql/17/main",
             # you can add more mounts here
         ],
-        platform=detect_platform(),
+        platform=_DOCKER_PLATFORM,
         mount_dir=mount_dir,
         working_dir="/workspace",
-    ) as workspace:
-        # 3) Create agent
-        agent = get_default_agent(
-            llm=llm,
-            cli_mode=True,
-        )
+    )
+    workspace.__enter__()
+    return workspace
 
-        # 4) Set up callback collection
-        received_events: list = []
-        last_event_time = {"ts": time.time()}
-
-        def event_callback(event) -> None:
-            event_type = type(event).__name__
-            logger.info(f"🔔 Callback received event: {event_type}\n{event}")
-            received_events.append(event)
-            last_event_time["ts"] = time.time()
-
-        conversation = Conversation(
-            agent=agent,
-            workspace=workspace,
-            callbacks=[event_callback],
-            max_iteration_per_run=MAX_ITERATIONS,
-        )
-        assert isinstance(conversation, RemoteConversation)
 
-        try:
-            logger.info(f"\n📋 Conversation ID: {conversation.state.id}")
+# pg_ctl is not on PATH in the Debian postgres layout this image uses
+_PG_CTL = "/usr/lib/postgresql/17/bin/pg_ctl"
+
+
+def reset_workspace(workspace):
+    """Wipe the workspace files and database between samples instead of
+    tearing down and restarting the container."""
+    # /workspace/db is the live PGDATA bind mount — it must survive the
+    # wipe; the schema reset below is what clears the database itself
+    workspace.execute_command(
+        "find /workspace -mindepth 1 -maxdepth 1 ! -name db -exec rm -rf {} + && "
+        "psql -U myappuser -d myapp -c 'DROP SCHEMA public CASCADE; CREATE SCHEMA public;'"
+    )
+
+
+def quiesce_postgres(workspace):
+    """Cleanly stop postgres before the host-side snapshot of the
+    bind-mounted data dir. Eval reads that dir as a PGDATA cluster; copying
+    it while the server is running produces a torn snapshot that recovery
+    can reject. The old per-sample containers only exposed the dir after a
+    clean container exit — this restores that guarantee."""
+    workspace.execute_command(
+        f"{_PG_CTL} -D /var/lib/postgresql/17/main -m fast -w stop"
+    )
+
+
+def resume_postgres(workspace):
+    """Bring postgres back up after the snapshot."""
+    workspace.execute_command(
+        f"{_PG_CTL} -D /var/lib/postgresql/17/main -w start"
+    )
+
+
+def copy_sample_dir(src, dst):
+    """Snapshot the worker mount dir for evaluation."""
+    try:
+        shutil.copytree(src, dst, dirs_exist_ok=True)
+    except PermissionError:
+        # db/ files are uid 10001 mode 0700; outside root, fall back to one
+        # sudo copy, mirroring the chown fallback in open_workspace
+        os.makedirs(dst, exist_ok=True)
+        subprocess.run(["sudo", "cp", "-a", f"{src}/.", dst], check=True)
+
+
+def process_single(workspace, instruction):
+    # heavy SDK imports deferred until a sample actually runs
+    from openhands.sdk import Conversation, RemoteConversation, get_logger
+    from openhands.tools.preset.default import get_default_agent
 
-            logger.info("📝 Sending message...")
-            conversation.send_message(prompt)
-            logger.info("🚀 Running conversation...")
+    logger = get_logger(__name__)
+
+    # create prompt: the prefix is byte-identical across samples so the
+    # backend can hit its prompt cache, and no .format() runs per sample
+    prompt = FULLSTACK_PROMPT_PREFIX + instruction
+
+    # 3) Create agent
+    agent = get_default_agent(
+        llm=get_llm(),
+        cli_mode=True,
+    )
+
+    # 4) Set up callback collection
+    received_events: list = []
+    settle = threading.Event()
+
+    def event_callback(event) -> None:
+        event_type = type(event).__name__
+        logger.info(f"🔔 Callback received event: {event_type}\n{event}")
+        received_events.append(event)
+        settle.set()
+
+    conversation = Conversation(
+        agent=agent,
+        workspace=workspace,
+        callbacks=[event_callback],
+        max_iteration_per_run=MAX_ITERATIONS,
+    )
+    assert isinstance(conversation, RemoteConversation)
+
+    try:
+        logger.info(f"\n📋 Conversation ID: {conversation.state.id}")
+
+        logger.info("📝 Sending message...")
+        conversation.send_message(prompt)
+        logger.info("🚀 Running conversation...")
+
+        # transient connection failures to the backend get retried with
+        # backoff instead of burning the whole sample
+        @retry(
+            stop=stop_after_attempt(3),
+            wait=wait_exponential(min=2, max=60),
+            retry=retry_if_exception_type(ConnectionError),
+            reraise=True,
+        )
+        def _run_conversation():
             conversation.run()
-            logger.info("✅ First task completed!")
-            logger.info(f"Agent status: {conversation.state.execution_status}")
 
-            # Wait for events to settle (no events for 2 seconds)
-            logger.info("⏳ Waiting for events to stop...")
-            while time.time() - last_event_time["ts"] < 2.0:
-                time.sleep(0.1)
-            logger.info("✅ Events have stopped")
+        _run_conversation()
+        logger.info("✅ First task completed!")
+        logger.info(f"Agent status: {conversation.state.execution_status}")
+
+        # Wait for events to settle (no events for 2 seconds); the wait
+        # returns immediately once a quiet 2s window elapses instead of
+        # polling 10x a second
+        logger.info("⏳ Waiting for events to stop...")
+        while True:
+            settle.clear()
+            if not settle.wait(timeout=2.0):
+                break
+        logger.info("✅ Events have stopped")
 
+    finally:
+        print("\n🧹 Cleaning up conversation...")
+        conversation.close()
+
+
+async def run_all(test_datas):
+    # one line-buffered append handle for the whole run instead of
+    # reopening the checkpoint file after every sample
+    log_fh = open(LOG_FILE, "a", encoding="utf-8", buffering=1)
+    limiter = AsyncLimiter(SESSIONS_PER_MINUTE, 60)
+
+    # pre-warm one workspace per worker so container startup and postgres
+    # boot are paid once per run, not once per sample
+    pool = asyncio.Queue()
+    workspaces = []
+    for worker_idx in range(MAX_WORKERS):
+        worker_mount_dir = os.path.join(RUN_DIR, f"worker_{worker_idx}")
+        workspace = await asyncio.to_thread(open_workspace, worker_mount_dir)
+        workspaces.append(workspace)
+        pool.put_nowait((worker_mount_dir, workspace))
+
+    async def run_one(data):
+        instruction = data["instruction"]
+        sample_id = data["id"]
+        await limiter.acquire()
+        # the pool bounds concurrency to MAX_WORKERS
+        worker_mount_dir, workspace = await pool.get()
+        try:
+            print(f"Running sample {sample_id}")
+            # process_single blocks on the agent, so offload it
+            await asyncio.to_thread(process_single, workspace, instruction)
+            # persist this sample's files and db for evaluation; postgres is
+            # stopped around the copy so the snapshot is a cleanly shut-down
+            # cluster, then restarted for the next sample
+            sample_dir = os.path.join(RUN_DIR, sample_id)
+            await asyncio.to_thread(quiesce_postgres, workspace)
+            try:
+                await asyncio.to_thread(copy_sample_dir, worker_mount_dir, sample_dir)
+            finally:
+                await asyncio.to_thread(resume_postgres, workspace)
         finally:
-            print("\n🧹 Cleaning up conversation...")
-            conversation.close()
+            try:
+                # always hand the next sample a clean workspace — on the
+                # error path too, or the failed sample's files and schema
+                # would leak into whatever checks out this worker next
+                await asyncio.to_thread(reset_workspace, workspace)
+            finally:
+                pool.put_nowait((worker_mount_dir, workspace))
+        log_fh.write(orjson.dumps(data).decode() + "\n")
+        log_fh.flush()
+
+    try:
+        tasks = [asyncio.ensure_future(run_one(data)) for data in test_datas]
+        for task in tqdm_asyncio.as_completed(tasks):
+            await task
+    finally:
+        log_fh.close()
+        for workspace in workspaces:
+            workspace.__exit__(None, None, None)
 
 
 def main():
     test_datas = load_jsonl(TEST_FILE)
+    os.makedirs(RUN_DIR, exist_ok=True)
 
     if os.path.isfile(LOG_FILE):
-        log_datas = load_jsonl(LOG_FILE)
-        logged_ids = [data["id"] for data in log_datas]
-        filtered_test_datas = []
-        for test_data in tqdm(test_datas):
-            if test_data["id"] not in logged_ids:
-                filtered_test_datas.append(test_data)
-        test_datas = filtered_test_datas
-
-    for data in tqdm(test_datas):
-        instruction = data["instruction"]
-        sample_id = data["id"]
-        mount_dir = os.path.join(RUN_DIR, sample_id)
+        with open(LOG_FILE, "rb") as f:
+            logged_ids = {orjson.loads(line)["id"] for line in f if line.strip()}
+        # lazy set-difference: pending samples are never materialized twice
+        test_datas = (t for t in test_datas if t["id"] not in logged_ids)
 
-        print(f"Running sample {sample_id}")
-        process_single(mount_dir, instruction)
-        save_jsonl([data], LOG_FILE, mode="a")
+    asyncio.run(run_all(test_datas))
 
 
 if __name__ == "__main__":
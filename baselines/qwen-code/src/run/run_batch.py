@@ -1,52 +1,128 @@
-import json
 import os
+import functools
+import orjson
+import asyncio
+import logging
+import hashlib
+import shutil
+import subprocess
+import tempfile
+import diskcache
+from aiolimiter import AsyncLimiter
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    retry_if_result,
+    stop_after_attempt,
+    wait_exponential,
+)
 from tqdm import tqdm
+from tqdm.asyncio import tqdm_asyncio
 import traceback
 from dotenv import load_dotenv
 load_dotenv()
 
+try:
+    # faster event loop for the subprocess-bound driver; unix-only
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 from start_qwen_cli import execute_qwen_cli
 from sandbox import create_docker_compose_file, start_docker_containers, stop_docker_containers, free_docker_port
 
 TIMEOUT = 1800
+# each concurrent worker gets its own host DB port (5432 + worker_idx)
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "4"))
+
+# content-addressed cache of generated repos so re-runs of the same
+# (model, prompt) pair skip the agent entirely
+OUTPUT_CACHE = diskcache.Cache("cache/qwen-code-outputs")
+
+# cap how fast new agent sessions launch so the backend is not hammered
+SESSIONS_PER_MINUTE = int(os.getenv("SESSIONS_PER_MINUTE", "10"))
+
+# transient CLI failures (timeouts, connection resets, nonzero exits)
+# get retried with exponential backoff instead of burning the sample
+_cli_retry = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(min=2, max=60),
+    retry=(
+        retry_if_exception_type((subprocess.TimeoutExpired, ConnectionError))
+        | retry_if_result(lambda code: code != 0)
+    ),
+)
 
 def load_jsonl(in_file):
-    datas = []
-    with open(in_file, "r", encoding="utf-8") as f:
+    # stream records instead of materializing the whole file
+    with open(in_file, "rb") as f:
         for line in f:
-            datas.append(json.loads(line))
-    return datas
+            if line.strip():
+                yield orjson.loads(line)
 
 
 def save_jsonl(datas, out_file, mode="w"):
     with open(out_file, mode, encoding="utf-8") as f:
         for data in tqdm(datas):
-            f.write(json.dumps(data, ensure_ascii=False) + "\n")
+            f.write(orjson.dumps(data).decode() + "\n")
             
             
-fullstack_prompt_template = "Create a website repository based on the given user instruction with these rules: 1. If the site needs dynamic data, include:   - A frontend that fetches all data from backend APIs. No hard-coded or mock data is allowed.   - A backend that connects to an external PostgreSQL database using these exact environment variables:  DB_HOST=localhost, DB_PORT=5432, DB_USERNAME=myappuser, DB_PASSWORD=myapppassword, DB_NAME=myapp. Every data operation must hit this database.    2. If the site is strictly static (e.g., marketing or documentation), a backend is not required.    3. Configure the repository's `package.json` file so that the command `npm run install:all` can install dependencies for both the frontend and the backend, and `npm run dev` can concurrently start the frontend and the backend services.    4. Do not run `npm run dev` directly as it would block the process indefinitely.    user instruction: {instruction}"
+# static rules shared by every sample; written to QWEN.md so the CLI loads
+# them as context. Only the DB port varies, and only across worker slots, so
+# the backend still reuses its prompt cache per slot.
+fullstack_prompt_prefix = "Create a website repository based on the given user instruction with these rules: 1. If the site needs dynamic data, include:   - A frontend that fetches all data from backend APIs. No hard-coded or mock data is allowed.   - A backend that connects to an external PostgreSQL database using these exact environment variables:  DB_HOST=localhost, DB_PORT={db_port}, DB_USERNAME=myappuser, DB_PASSWORD=myapppassword, DB_NAME=myapp. Every data operation must hit this database.    2. If the site is strictly static (e.g., marketing or documentation), a backend is not required.    3. Configure the repository's `package.json` file so that the command `npm run install:all` can install dependencies for both the frontend and the backend, and `npm run dev` can concurrently start the frontend and the backend services.    4. Do not run `npm run dev` directly as it would block the process indefinitely."
+
+
+@functools.lru_cache(maxsize=None)
+def _prefix_bytes(db_port):
+    """Encode the QWEN.md rules for one port; there are only MAX_WORKERS
+    distinct ports, so every write stays a straight byte copy."""
+    return fullstack_prompt_prefix.format(db_port=db_port).encode("utf-8")
     
         
-def process_single(sample, log_dir_root, working_dir_root):
+def process_single(sample, log_dir_root, working_dir_root, db_port=5432):
     log_dir = os.path.join(log_dir_root, sample["id"])
     working_dir = os.path.join(working_dir_root, sample["id"])
-    
+
     os.makedirs(log_dir, exist_ok=True)
     os.makedirs(working_dir, exist_ok=True)
     log_file = os.path.join(log_dir, "output.log")
-    
-    prompt = fullstack_prompt_template.format(instruction=sample["instruction"])
-    
+
+    # the static rules go into QWEN.md; the per-sample prompt is just the
+    # instruction. The rules carry this worker's DB port, so rewrite the
+    # file if a restart hands the sample a different port slot
+    qwen_md = os.path.join(working_dir, "QWEN.md")
+    prefix_bytes = _prefix_bytes(db_port)
+    if not os.path.exists(qwen_md) or open(qwen_md, "rb").read() != prefix_bytes:
+        with open(qwen_md, "wb") as f:
+            f.write(prefix_bytes)
+    prompt = "user instruction: " + sample["instruction"]
+
+    # re-materialize a previously generated repo for the same (model, prompt)
+    cache_key = hashlib.blake2b(
+        f"{os.environ['OPENAI_MODEL']}|{prompt}".encode(), digest_size=16
+    ).hexdigest()
+    cached = OUTPUT_CACHE.get(cache_key)
+    if cached is not None:
+        with tempfile.NamedTemporaryFile(suffix=".tar.gz", delete=False) as tmp:
+            tmp.write(cached)
+        try:
+            shutil.unpack_archive(tmp.name, working_dir)
+        finally:
+            os.remove(tmp.name)
+        print(f"Cache hit for sample {sample['id']}, skipping agent run")
+        return
+
     compose_path = os.path.join(log_dir, f"webgen-agent_{sample['id']}", "docker-compose.yml")
     db_dir = os.path.join(log_dir, "db")
-    DB_PORT = 5432
-    create_docker_compose_file(working_dir, log_dir, compose_path, db_dir, db_port=DB_PORT)
+    create_docker_compose_file(working_dir, log_dir, compose_path, db_dir, db_port=db_port)
     stop_docker_containers(compose_path)
-    free_docker_port(DB_PORT)
+    free_docker_port(db_port)
     start_docker_containers(compose_path)
 
     try:
-        execute_qwen_cli(
+        _cli_retry(execute_qwen_cli)(
             prompt=prompt,
             working_dir=working_dir,
             model=os.environ["OPENAI_MODEL"],
@@ -61,6 +137,15 @@ def process_single(sample, log_dir_root, working_dir_root):
             log_file_path=log_file,
             timeout=TIMEOUT,
         )
+        # archive the generated repo so identical re-runs become cache hits
+        archive = shutil.make_archive(
+            os.path.join(tempfile.gettempdir(), cache_key), "gztar", working_dir
+        )
+        try:
+            with open(archive, "rb") as fh:
+                OUTPUT_CACHE[cache_key] = fh.read()
+        finally:
+            os.remove(archive)
     except Exception as err:
         # Option A: one-liner (logs message AND traceback)
         logging.exception(
@@ -86,18 +171,47 @@ def main():
     
     samples = load_jsonl(test_file)
     if os.path.isfile(finished_file):
-        finished_ids = [d["id"] for d in load_jsonl(finished_file)]
-        filtered_samples = []
-        for sample in samples:
-            if sample["id"] not in finished_ids:
-                filtered_samples.append(sample)
-        samples = filtered_samples
-    
-    for sample in tqdm(samples):
-        
-        process_single(sample, log_dir_root, working_dir_root)
-        save_jsonl([{"id": sample["id"]}], finished_file, mode="a")
-        
-        
+        with open(finished_file, "rb") as f:
+            finished_ids = {orjson.loads(line)["id"] for line in f if line.strip()}
+        # lazy set-difference: pending samples are never materialized twice
+        samples = (s for s in samples if s["id"] not in finished_ids)
+
+    asyncio.run(run_all(samples, log_dir_root, working_dir_root))
+
+
+async def run_all(samples, log_dir_root, working_dir_root):
+    finished_file = os.path.join(log_dir_root, "finished_samples.jsonl")
+    os.makedirs(log_dir_root, exist_ok=True)
+    # keep one line-buffered append handle open for the whole run
+    finished_fh = open(finished_file, "a", encoding="utf-8", buffering=1)
+    sem = asyncio.Semaphore(MAX_WORKERS)
+    limiter = AsyncLimiter(SESSIONS_PER_MINUTE, 60)
+    # pool of host DB ports so concurrent samples never fight over 5432
+    db_ports = asyncio.Queue()
+    for worker_idx in range(MAX_WORKERS):
+        db_ports.put_nowait(5432 + worker_idx)
+
+    async def run_one(sample):
+        async with sem:
+            await limiter.acquire()
+            db_port = await db_ports.get()
+            try:
+                # the CLI call and docker setup are blocking, so offload them
+                await asyncio.to_thread(
+                    process_single, sample, log_dir_root, working_dir_root, db_port
+                )
+            finally:
+                db_ports.put_nowait(db_port)
+            finished_fh.write(orjson.dumps({"id": sample["id"]}).decode() + "\n")
+            finished_fh.flush()
+
+    try:
+        tasks = [asyncio.ensure_future(run_one(sample)) for sample in samples]
+        for task in tqdm_asyncio.as_completed(tasks):
+            await task
+    finally:
+        finished_fh.close()
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
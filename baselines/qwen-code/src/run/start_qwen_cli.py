@@ -7,10 +7,17 @@ This script uses subprocess to launch the CLI with the appropriate arguments.
 import subprocess
 import sys
 import os
+import shutil
+import threading
 import argparse
 import logging
 from typing import Optional
 
+# Resolve npx once so subprocess does not need a shell or a PATH lookup per call
+_NPX_PATH = shutil.which("npx.cmd") or shutil.which("npx") or "npx"
+
+_IS_WINDOWS = os.name == 'nt'
+
 
 def setup_logging(log_file_path: Optional[str] = None):
     """
@@ -88,7 +95,7 @@ def start_qwen_cli(
     setup_logging(log_file_path)
 
     # Build the command
-    cmd = ["npx", "@qwen-code/qwen-code@0.5.2"]
+    cmd = [_NPX_PATH, "@qwen-code/qwen-code@0.5.2"]
 
     # Add authentication settings if provided
     if auth_type:
@@ -135,32 +142,47 @@ def start_qwen_cli(
     try:
         # Prepare the subprocess with appropriate output handling
         if log_file_path:
-            # If logging to file, capture output and write to both file and console
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                env=os.environ.copy(),
-                shell=(os.name == 'nt'),  # Use shell on Windows
-                cwd=working_dir,
-                timeout=timeout,
-            )
-
-            # Log the output
-            if result.stdout:
-                logging.info(f"CLI Output:\n{result.stdout}")
-            if result.stderr:
-                logging.error(f"CLI Error Output:\n{result.stderr}")
-
-            # Print to console as well
-            if result.stdout:
-                print(result.stdout, end='')
-            if result.stderr:
-                print(result.stderr, end='', file=sys.stderr)
-
-            # Return the exit code
-            return result.returncode
+            # Stream output line-by-line straight into the log file instead of
+            # buffering the whole CLI trace in memory until exit
+            with open(log_file_path, "a", buffering=1, encoding="utf-8") as logf:
+                proc = subprocess.Popen(
+                    cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    bufsize=1,
+                    shell=_IS_WINDOWS,  # Use shell on Windows
+                    cwd=working_dir,
+                )
+                # the line-by-line read blocks with no timeout of its own, so
+                # a watchdog kills the process at the deadline; the kill
+                # closes the pipe, the loop sees EOF, and the timeout is
+                # reported below
+                timed_out = threading.Event()
+
+                def _kill_on_timeout():
+                    timed_out.set()
+                    proc.kill()
+
+                watchdog = (
+                    threading.Timer(timeout, _kill_on_timeout)
+                    if timeout is not None
+                    else None
+                )
+                if watchdog is not None:
+                    watchdog.start()
+                try:
+                    for line in proc.stdout:
+                        logf.write(line)
+                        print(line, end='')
+                    returncode = proc.wait()
+                finally:
+                    if watchdog is not None:
+                        watchdog.cancel()
+                if timed_out.is_set():
+                    logging.error(f"Qwen Code CLI timed out after {timeout} seconds")
+                    return 1
+                return returncode
         else:
             # If not logging to file, run normally
             result = subprocess.run(
@@ -168,8 +190,7 @@ def start_qwen_cli(
                 check=True,
                 stdout=sys.stdout,
                 stderr=sys.stderr,
-                env=os.environ.copy(),
-                shell=(os.name == 'nt'), # Use shell on Windows
+                shell=_IS_WINDOWS, # Use shell on Windows
                 cwd=working_dir,
                 timeout=timeout,
             )
@@ -229,8 +250,8 @@ def start_qwen_cli_shell_fallback(
     # Set up logging
     setup_logging(log_file_path)
 
-    # Build the command as a string for shell execution
-    cmd_parts = ["npx", "@qwen-code/qwen-code@0.5.2"]
+    # Build the command as an argv list; the resolved npx path means no shell is needed
+    cmd_parts = [_NPX_PATH, "@qwen-code/qwen-code@0.5.2"]
 
     # Add authentication settings if provided
     if auth_type:
@@ -271,20 +292,20 @@ def start_qwen_cli_shell_fallback(
     if additional_args:
         cmd_parts.extend(additional_args)
 
-    cmd_str = ' '.join(f'"{part}"' if ' ' in part else part for part in cmd_parts)
+    cmd_str = ' '.join(cmd_parts)
 
-    logging.info(f"Running command (with shell fallback): {cmd_str}")
+    logging.info(f"Running command (fallback): {cmd_str}")
 
     try:
         # Prepare the subprocess with appropriate output handling
         if log_file_path:
             # If logging to file, capture output and write to both file and console
             result = subprocess.run(
-                cmd_str,
+                cmd_parts,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
-                shell=True,
+                shell=False,
                 cwd=working_dir,
                 timeout=timeout,
             )
@@ -306,11 +327,11 @@ def start_qwen_cli_shell_fallback(
         else:
             # If not logging to file, run normally
             result = subprocess.run(
-                cmd_str,
+                cmd_parts,
                 check=True,
                 stdout=sys.stdout,
                 stderr=sys.stderr,
-                shell=True,
+                shell=False,
                 cwd=working_dir,
                 timeout=timeout,
             )
@@ -389,7 +410,7 @@ def execute_qwen_cli(
     )
 
     # If it fails on Windows, try the fallback method
-    if exit_code != 0 and os.name == 'nt':
+    if exit_code != 0 and _IS_WINDOWS:
         print("Primary method failed, trying fallback method for Windows...")
         # Use the shell fallback for both auth and non-auth modes since they're the same function
         exit_code = start_qwen_cli_shell_fallback(
@@ -1,15 +1,12 @@
 """
 Selenium helper that
 
-1.  opens one Chrome session with two windows
-      • window 0 → http://localhost:5173/
-      • window 1 → http://127.0.0.1:8003/
+1.  opens one Chrome session with a bolt.diy window
+      • http://localhost:5173/
 2.  offers  run_single_instruction()  which
-      • (optionally) clicks  “Clear Cache”
-      • pastes a prompt
-      • presses the “Generate” button
-      • keeps the browser alive for up-to 30 minutes so the
-        backend has enough time to finish its job.
+      • (optionally) clears the client's prompt cache via GET /clear
+      • submits the prompt via POST /textgen
+      • waits for the zip-path log while polling GET /status
 
 Tested with Selenium-4.x and Chrome-122+.  
 Make sure a matching chromedriver is on PATH or set
@@ -19,20 +16,21 @@ the CHROMEDRIVER env-var to its location.
 from __future__ import annotations
 
 import os
+import tempfile
+import threading
 import time
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, TYPE_CHECKING
 import shutil
-import json
+
+import orjson
+import requests
 from tqdm import tqdm
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.webdriver import WebDriver
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait, Select
+if TYPE_CHECKING:
+    from selenium.webdriver.chrome.webdriver import WebDriver
 
 
 # --------------------------------------------------------------------------- #
@@ -46,6 +44,8 @@ DOWNLOAD_PATH = r"downloads\qwen3coder480B"
 OUTPUT_DIR = r"outputs\qwen3coder480B"
 LAST_ZIP_LOG_PATH = r"client\last_zip_path_log.txt"
 TIMEOUT_MIN = 30
+# headless by default; set TDDEV_HEADLESS=0 to watch the browser while debugging
+HEADLESS = os.environ.get("TDDEV_HEADLESS", "1") == "1"
 
 if not os.path.isdir(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -53,23 +53,40 @@ if not os.path.isdir(OUTPUT_DIR):
 if not os.path.isdir(DOWNLOAD_PATH):
     os.makedirs(DOWNLOAD_PATH, exist_ok=True)
 
+
 def _new_driver(download_path: str, chrome_binary: str | None = None) -> WebDriver:
     """
     Launch Chrome with custom download directory and (optionally) a specific
     executable path.
     """
+    # Selenium is only needed once a browser is actually launched, so the
+    # import cost is not paid at module load
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options as ChromeOptions
+    from selenium.webdriver.chrome.service import Service as ChromeService
+
     download_path = str(Path(download_path).expanduser().resolve())
     os.makedirs(download_path, exist_ok=True)
 
     opts = ChromeOptions()
-    opts.add_argument("--start-maximized")
+    if HEADLESS:
+        # no GUI window or GPU process to spin up – Chrome starts faster
+        # and uses roughly half the memory per session
+        opts.add_argument("--headless=new")
+        opts.add_argument("--disable-gpu")
+        opts.add_argument("--no-sandbox")
+        opts.add_argument("--disable-dev-shm-usage")
+        opts.add_argument("--window-size=1920,1080")
+    else:
+        opts.add_argument("--start-maximized")
     if chrome_binary:
         if not Path(chrome_binary).exists():
             raise FileNotFoundError(f"Chrome binary not found: {chrome_binary}")
         opts.binary_location = chrome_binary
 
+    # the download directory itself is routed per sample over CDP
+    # (Page.setDownloadBehavior), so it is no longer baked into the profile
     prefs: Dict[str, object] = {
-        "download.default_directory": download_path,
         "download.prompt_for_download": False,
         "download.directory_upgrade": True,
         "safebrowsing.enabled": True,
@@ -79,25 +96,50 @@ def _new_driver(download_path: str, chrome_binary: str | None = None) -> WebDriv
 
     opts.add_argument("--disable-popup-blocking")
 
+    # reuse a warm profile so Chrome skips first-run setup (default prefs,
+    # certificate stores, …); keyed by download dir so parallel workers
+    # never fight over the profile lock
+    profile_dir = Path(tempfile.gettempdir()) / (
+        f"tddev_chrome_profile_{os.path.basename(download_path)}"
+    )
+    profile_dir.mkdir(exist_ok=True)
+    opts.add_argument(f"--user-data-dir={profile_dir}")
+    opts.add_argument("--no-first-run")
+    opts.add_argument("--no-default-browser-check")
+    opts.add_argument("--disable-extensions")
+    opts.add_argument("--disable-background-networking")
+    opts.add_argument("--disable-sync")
+    opts.add_argument("--metrics-recording-only")
+
     service = ChromeService()      # assumes chromedriver in PATH or webdriver-manager
     return webdriver.Chrome(service=service, options=opts)
 
 
-def _open_two_windows(driver: WebDriver) -> List[str]:
+class _ZipLogHandler(FileSystemEventHandler):
+    """Sets an event the instant the zip-path log file appears."""
+
+    def __init__(self, target_path: str, event: threading.Event) -> None:
+        self._target = os.path.abspath(target_path)
+        self._event = event
+
+    def on_created(self, event) -> None:
+        if os.path.abspath(event.src_path) == self._target:
+            self._event.set()
+
+    def on_moved(self, event) -> None:
+        # covers write-to-temp-then-rename producers
+        if os.path.abspath(event.dest_path) == self._target:
+            self._event.set()
+
+
+def _open_bolt_window(driver: WebDriver) -> str:
     """
-    Returns the list of window handles, index 0 for localhost:5173
-    and index 1 for 127.0.0.1:8003
+    Opens bolt.diy and returns its window handle.  Generation and the zip
+    download happen inside this tab, so it must stay alive; the TDDev
+    client itself is driven over plain HTTP.
     """
-    # first window
     driver.get(BOLT_DIY_ADDRESS)
-    first_handle = driver.current_window_handle
-
-    # second window
-    driver.switch_to.new_window("window")
-    driver.get(TDDEV_CLIENT_ADDRESS)
-    second_handle = driver.current_window_handle
-
-    return [first_handle, second_handle]
+    return driver.current_window_handle
 
 
 # --------------------------------------------------------------------------- #
@@ -105,90 +147,96 @@ def _open_two_windows(driver: WebDriver) -> List[str]:
 # --------------------------------------------------------------------------- #
 
 def run_single_instruction(
+    driver: WebDriver,
+    bolt_handle: str,
     instruction: str,
     test_id: str = "",
-    download_path: str = "./downloads",
     output_dir: str = "./outputs",
-    chrome_binary: str | None = CHROME_BINARY,
 ) -> None:
     """
-    Drives the UI at  http://127.0.0.1:8003/  once.
+    Runs one sample through the TDDev client's HTTP API.
+
+    GET /clear and POST /textgen do exactly what the Clear-Cache and
+    Generate buttons did, without DOM latency or stale-element risk.
 
     Parameters
     ----------
+    driver : WebDriver
+        The long-lived Chrome session holding the bolt.diy tab.
+    bolt_handle : str
+        Window handle from _open_bolt_window.
     instruction : str
-        Prompt text that will be typed into the textarea.
+        Prompt text submitted to the client.
     test_id : str
         Optional identifier – used only for debug screenshots.
-    download_path : str
-        Directory that Chrome will use as its default download folder.
     """
-    driver = _new_driver(download_path, chrome_binary)
-    win0, win1 = _open_two_windows(driver)
-
-    try:
-        # ――― switch to the second window (the Text Generation tool) ―――
-        driver.switch_to.window(win1)
+    # keep the bolt.diy tab focused – it performs the actual generation
+    driver.switch_to.window(bolt_handle)
 
-        wait = WebDriverWait(driver, 30)
+    # route downloads on the live session – one CDP roundtrip instead of
+    # rebuilding the driver to change the download folder
+    driver.execute_cdp_cmd(
+        "Page.setDownloadBehavior",
+        {"behavior": "allow", "downloadPath": str(Path(DOWNLOAD_PATH).resolve())},
+    )
 
-        # 1)  Click “Clear Cache” if it is visible
+    try:
+        # 1)  Clear cached prompt/requirement files (was the “Clear Cache” button)
         try:
-            clear_btn = wait.until(
-                EC.presence_of_element_located((By.ID, "clear-cache-btn"))
-            )
-            if clear_btn.is_displayed() and clear_btn.is_enabled():
-                clear_btn.click()
-                # page will reload – wait until the textarea is back
-                wait.until(EC.staleness_of(clear_btn))
-                wait.until(
-                    EC.presence_of_element_located((By.ID, "prompt"))
-                )
-        except Exception:
-            # Clear-cache button absent – totally fine
+            requests.get(TDDEV_CLIENT_ADDRESS + "clear", timeout=30)
+        except requests.RequestException:
+            # cache clearing is best-effort, exactly as before
             pass
 
-        try:
-            model_select_el = wait.until(EC.presence_of_element_located((By.ID, "model")))
-            if model_select_el.is_enabled():                       # may be disabled by cache lock
-                Select(model_select_el).select_by_value("qwen3coder")
-        except Exception:
-            print("⚠️  Could not select model; proceeding with default.")
-
-        # 2)  Fill the textarea
-        prompt_el = wait.until(
-            EC.presence_of_element_located((By.ID, "prompt"))
-        )
-        prompt_el.clear()
-        prompt_el.send_keys(instruction)
-
-        # 3)  Press the “Generate” button
-        gen_btn = wait.until(
-            EC.element_to_be_clickable((By.ID, "submit-btn"))
+        # 2)  Submit prompt + model (was textarea + “Generate”); the route
+        #     blocks through requirement generation, so give it a long timeout
+        resp = requests.post(
+            TDDEV_CLIENT_ADDRESS + "textgen",
+            json={"prompt": instruction, "model": "qwen3coder"},
+            timeout=TIMEOUT_MIN * 60,
         )
-        gen_btn.click()
+        resp.raise_for_status()
 
-        # 4)  Let the generation run for up-to 30 min.
-        #     Replace this with a smarter wait condition if available.
+        # 3)  Wait until the backend actually finishes instead of sleeping
+        #     the full timeout: a filesystem watch wakes us the instant
+        #     the zip-log file lands, and /status is probed every few
+        #     seconds as a liveness check on the client app.
         MAX_SECONDS = TIMEOUT_MIN * 60
-        poll_interval = 5
-        elapsed = 0
-        print("Waiting for the backend to finish (30 min max)…")
-        while elapsed < MAX_SECONDS:
-            time.sleep(poll_interval)
-            elapsed += poll_interval
-            # If result box is non-empty you could break early here:
-            # result_txt = driver.find_element(By.ID, "result").text.strip()
-            # if result_txt and result_txt.lower() != "loading...":
-            #     break
+        print(f"Waiting for the backend to finish ({TIMEOUT_MIN} min max)…")
+        done = threading.Event()
+        watch_dir = os.path.dirname(os.path.abspath(LAST_ZIP_LOG_PATH)) or "."
+        observer = Observer()
+        observer.schedule(_ZipLogHandler(LAST_ZIP_LOG_PATH, done), watch_dir)
+        observer.start()
+        try:
+            if os.path.isfile(LAST_ZIP_LOG_PATH):
+                done.set()  # landed before the watch started
+            deadline = time.time() + MAX_SECONDS
+            while time.time() < deadline and not done.is_set():
+                if done.wait(timeout=5.0):
+                    break
+                try:
+                    requests.get(TDDEV_CLIENT_ADDRESS + "status", timeout=5)
+                except requests.RequestException:
+                    print("⚠️  Client app stopped responding.")
+                    break
+        finally:
+            observer.stop()
+            observer.join()
 
         with open(LAST_ZIP_LOG_PATH, "r", encoding="utf-8") as f:
             last_zip_path = f.read().strip()
             print(f"Last downloaded zip path: {last_zip_path}")
         if last_zip_path and os.path.isfile(last_zip_path):
             dest_path = os.path.join(OUTPUT_DIR, f"{test_id}.zip")
-            shutil.copy(last_zip_path, dest_path)
-            print(f"Copied output zip to: {dest_path}")
+            try:
+                # downloads and outputs share a filesystem, so this is a
+                # free rename instead of rewriting every byte of the zip
+                os.replace(last_zip_path, dest_path)
+            except OSError:
+                shutil.copy2(last_zip_path, dest_path)
+                os.remove(last_zip_path)
+            print(f"Moved output zip to: {dest_path}")
 
         # make sure to clean up the log file so next run starts fresh
         if os.path.isfile(LAST_ZIP_LOG_PATH):
@@ -197,28 +245,33 @@ def run_single_instruction(
         print(f"❌  Error during run: {e}")
         exit(1)
 
-    finally:
-        # keep the browser for debugging?  comment out if unwanted
-        driver.quit()
-        pass
-
 
 def main():
     in_file = r"data\test.json"
-    with open(in_file, "r", encoding="utf-8") as f:
-        datas = json.load(f)
-
-    for data in tqdm(datas):
-        print(f"Running test id: {data['id']}")
-        prompt = data["instruction"]
-        test_id = data["id"]
-        if os.path.isfile(os.path.join(OUTPUT_DIR, f"{test_id}.zip")):
-            print(f"Output for test id {test_id} already exists. Skipping.")
-            continue
-        run_single_instruction(prompt, test_id=test_id, download_path=DOWNLOAD_PATH, output_dir=OUTPUT_DIR)
+    datas = orjson.loads(Path(in_file).read_bytes())
+
+    # one directory listing instead of a stat call per sample
+    already_done = {p.stem for p in Path(OUTPUT_DIR).glob("*.zip")}
+
+    # one Chrome session for the whole run – relaunching per sample costs
+    # several seconds of browser cold-start each time
+    driver = _new_driver(DOWNLOAD_PATH, CHROME_BINARY)
+    bolt_handle = _open_bolt_window(driver)
+
+    try:
+        for data in tqdm(datas):
+            print(f"Running test id: {data['id']}")
+            prompt = data["instruction"]
+            test_id = data["id"]
+            if test_id in already_done:
+                print(f"Output for test id {test_id} already exists. Skipping.")
+                continue
+            run_single_instruction(driver, bolt_handle, prompt, test_id=test_id, output_dir=OUTPUT_DIR)
+    finally:
+        driver.quit()
 
 # --------------------------------------------------------------------------- #
 #                              example usage                                  #
 # --------------------------------------------------------------------------- #
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
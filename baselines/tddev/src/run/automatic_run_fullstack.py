@@ -12,27 +12,31 @@ NEW:
 
 from __future__ import annotations
 
-import json
+import atexit
 import os
 import shutil
 import socket
 import subprocess
 import sys
+import tempfile
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Dict, List
 import multiprocessing as _mp
 
 from types import ModuleType
-from typing import Any
+from typing import Any, TYPE_CHECKING
 
+import orjson
+import requests
 from tqdm import tqdm
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import Select, WebDriverWait
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+if TYPE_CHECKING:
+    from selenium import webdriver
 
 from sandbox import (
     create_docker_compose_file,
@@ -61,6 +65,13 @@ WORKING_DIR = os.path.abspath(r"outputs\qwen3coder30B_workspace")
 TIMEOUT_MIN = 50
 WAIT_AFTER_STOP_SEC = 60
 PORT_CHECK_TIMEOUT_SEC = 60
+DB_PORT = 5432
+# headless by default; set TDDEV_HEADLESS=0 to watch the browser while debugging
+HEADLESS = os.environ.get("TDDEV_HEADLESS", "1") == "1"
+
+# samples are dominated by backend-wait idle time, so K workers each with
+# their own client port / DB port / download dir give near-linear speedup
+MAX_WORKERS = int(os.environ.get("TDDEV_WORKERS", "1"))
 
 # Make sure mandatory directories exist
 for _d in (DOWNLOAD_PATH, OUTPUT_DIR):
@@ -75,11 +86,14 @@ CLIENT_PORT = 8003
 
 
 # ─── generic import/load of client/app.py ─────────────────────────────────────
-def _load_client_module() -> tuple[Any, str]:
+def _load_client_module(overrides: dict[str, Any] | None = None) -> tuple[Any, str]:
     """
     Dynamically loads `client/app.py` (or another file – adjust path if needed)
     and returns the exported web-app instance plus a string describing its type
     ("fastapi" or "flask").
+
+    `overrides` rebinds module globals after import – used to give each
+    worker its own LAST_ZIP_LOG_PATH / DOWNLOAD_PATH.
     """
     import importlib.util
     import sys
@@ -88,12 +102,21 @@ def _load_client_module() -> tuple[Any, str]:
     if not module_path.exists():
         raise FileNotFoundError(f"entry file not found: {module_path}")
 
-    sys.path.insert(0, str(CLIENT_DIR))  # so internal imports work
+    if str(CLIENT_DIR) not in sys.path:  # so internal imports work, once
+        sys.path.insert(0, str(CLIENT_DIR))
+
+    # re-use the already executed module when the same process loads the
+    # client again instead of re-running app.py top to bottom
+    mod = sys.modules.get("client_app")
+    if mod is None:
+        spec = importlib.util.spec_from_file_location("client_app", module_path)
+        mod = importlib.util.module_from_spec(spec)  # type: ignore[arg-type]
+        assert spec.loader is not None
+        sys.modules["client_app"] = mod
+        spec.loader.exec_module(mod)                 # type: ignore[attr-defined]
 
-    spec = importlib.util.spec_from_file_location("client_app", module_path)
-    mod = importlib.util.module_from_spec(spec)  # type: ignore[arg-type]
-    assert spec.loader is not None
-    spec.loader.exec_module(mod)                 # type: ignore[attr-defined]
+    for name, value in (overrides or {}).items():
+        setattr(mod, name, value)
 
     # Accept variable  'app' or 'application'
     web_app = getattr(mod, "app", None) or getattr(mod, "application", None)
@@ -115,16 +138,22 @@ def _load_client_module() -> tuple[Any, str]:
 
 
 # ─── launcher that supports both ASGI & WSGI apps ────────────────────────────
-def _serve_in_subprocess() -> None:
+def _serve_in_subprocess(
+    client_port: int = CLIENT_PORT,
+    overrides: dict[str, Any] | None = None,
+) -> None:
     """
     Executed in a separate interpreter via multiprocessing.Process.
     Detects the framework and starts either uvicorn (FastAPI) or
     waitress (Flask).  Blocks until the process is terminated.
+
+    The port and module overrides are passed explicitly because the
+    subprocess does not inherit globals mutated in the parent (spawn).
     """
     import os
     from pathlib import Path
 
-    web_app, kind = _load_client_module()
+    web_app, kind = _load_client_module(overrides)
 
     # ──────────────────────────────────────────────
     # Fix template / static lookup for Flask
@@ -149,7 +178,7 @@ def _serve_in_subprocess() -> None:
         uvicorn.run(
             web_app,
             host=CLIENT_HOST,
-            port=CLIENT_PORT,
+            port=client_port,
             log_level="info",
             workers=1,
             reload=False,
@@ -161,7 +190,7 @@ def _serve_in_subprocess() -> None:
         serve(
             web_app,
             host=CLIENT_HOST,
-            port=CLIENT_PORT,
+            port=client_port,
             threads=4,
             _quiet=True,
         )
@@ -172,7 +201,13 @@ def _start_client_app() -> _mp.Process:
     Forks / spawns a daemon process that runs the client web-service.
     Returns the Process object.
     """
-    proc = _mp.Process(target=_serve_in_subprocess, daemon=True)
+    overrides = {
+        "LAST_ZIP_LOG_PATH": LAST_ZIP_LOG_PATH,
+        "DOWNLOAD_PATH": DOWNLOAD_PATH,
+    }
+    proc = _mp.Process(
+        target=_serve_in_subprocess, args=(CLIENT_PORT, overrides), daemon=True
+    )
     proc.start()
     return proc
 
@@ -192,44 +227,66 @@ def _stop_client_app(proc: _mp.Process, timeout: int = 10) -> None:
 
 # ─── port-readiness probe ────────────────────────────────────────────────────
 def _is_port_open(host: str, port: int) -> bool:
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.settimeout(1)
-        try:
-            s.connect((host, port))
+    # a local connect that will succeed does so in microseconds, so a
+    # short timeout keeps failed probes cheap too
+    try:
+        with socket.create_connection((host, port), timeout=0.1):
             return True
-        except OSError:
-            return False
+    except OSError:
+        return False
 
 
 def wait_until_client_ready(timeout_sec: int = 60) -> None:
     """
     Block until TCP <host>:<port> is reachable or raise TimeoutError.
+
+    Polls with exponential backoff (10 ms → 500 ms) so a fast-starting
+    server is detected almost immediately without hammering a slow one.
     """
-    elapsed = 0
+    elapsed = 0.0
+    delay = 0.01
     while elapsed < timeout_sec:
         if _is_port_open(CLIENT_HOST, CLIENT_PORT):
             return
-        time.sleep(1)
-        elapsed += 1
+        time.sleep(delay)
+        elapsed += delay
+        delay = min(delay * 1.5, 0.5)
     raise TimeoutError(f"client service did not open {CLIENT_PORT} within {timeout_sec}s")
 
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Browser helpers (unchanged except for minor formatting)
 # ──────────────────────────────────────────────────────────────────────────────
+
 def _new_driver(download_path: str, chrome_binary: str | None = None) -> webdriver.Chrome:
+    # Selenium is only needed once a browser is actually launched, so the
+    # import cost is not paid at worker spawn
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options as ChromeOptions
+    from selenium.webdriver.chrome.service import Service as ChromeService
+
     download_path = str(Path(download_path).expanduser().resolve())
     os.makedirs(download_path, exist_ok=True)
 
     opts = ChromeOptions()
-    opts.add_argument("--start-maximized")
+    if HEADLESS:
+        # no GUI window or GPU process to spin up – Chrome starts faster
+        # and uses roughly half the memory per session
+        opts.add_argument("--headless=new")
+        opts.add_argument("--disable-gpu")
+        opts.add_argument("--no-sandbox")
+        opts.add_argument("--disable-dev-shm-usage")
+        opts.add_argument("--window-size=1920,1080")
+    else:
+        opts.add_argument("--start-maximized")
     if chrome_binary:
         if not Path(chrome_binary).exists():
             raise FileNotFoundError(f"Chrome binary not found: {chrome_binary}")
         opts.binary_location = chrome_binary
 
+    # the download directory itself is routed per sample over CDP
+    # (Page.setDownloadBehavior), so it is no longer baked into the profile
     prefs: Dict[str, object] = {
-        "download.default_directory": download_path,
         "download.prompt_for_download": False,
         "download.directory_upgrade": True,
         "safebrowsing.enabled": True,
@@ -238,80 +295,135 @@ def _new_driver(download_path: str, chrome_binary: str | None = None) -> webdriv
     opts.add_experimental_option("prefs", prefs)
     opts.add_argument("--disable-popup-blocking")
 
+    # reuse a warm profile so Chrome skips first-run setup (default prefs,
+    # certificate stores, …); keyed by download dir so parallel workers
+    # never fight over the profile lock
+    profile_dir = Path(tempfile.gettempdir()) / (
+        f"tddev_chrome_profile_{os.path.basename(download_path)}"
+    )
+    profile_dir.mkdir(exist_ok=True)
+    opts.add_argument(f"--user-data-dir={profile_dir}")
+    opts.add_argument("--no-first-run")
+    opts.add_argument("--no-default-browser-check")
+    opts.add_argument("--disable-extensions")
+    opts.add_argument("--disable-background-networking")
+    opts.add_argument("--disable-sync")
+    opts.add_argument("--metrics-recording-only")
+
     service = ChromeService()
     return webdriver.Chrome(service=service, options=opts)
 
 
-def _open_two_windows(driver: webdriver.Chrome) -> List[str]:
-    driver.get(BOLT_DIY_ADDRESS)
-    first_handle = driver.current_window_handle
+class _ZipLogHandler(FileSystemEventHandler):
+    """Sets an event the instant the zip-path log file appears."""
+
+    def __init__(self, target_path: str, event: threading.Event) -> None:
+        self._target = os.path.abspath(target_path)
+        self._event = event
+
+    def on_created(self, event) -> None:
+        if os.path.abspath(event.src_path) == self._target:
+            self._event.set()
+
+    def on_moved(self, event) -> None:
+        # covers write-to-temp-then-rename producers
+        if os.path.abspath(event.dest_path) == self._target:
+            self._event.set()
 
-    driver.switch_to.new_window("window")
-    driver.get(TDDEV_CLIENT_ADDRESS)
-    second_handle = driver.current_window_handle
 
-    return [first_handle, second_handle]
+def _open_bolt_window(driver: webdriver.Chrome) -> str:
+    """
+    Opens bolt.diy and returns its window handle.  Generation and the zip
+    download happen inside this tab, so it must stay alive; the TDDev
+    client itself is driven over plain HTTP.
+    """
+    driver.get(BOLT_DIY_ADDRESS)
+    return driver.current_window_handle
 
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Core: one UI interaction
 # ──────────────────────────────────────────────────────────────────────────────
 def run_single_instruction(
+    driver: webdriver.Chrome,
+    bolt_handle: str,
     instruction: str,
     test_id: str = "",
-    download_path: str = "./downloads",
     output_dir: str = "./outputs",
-    chrome_binary: str | None = CHROME_BINARY,
 ) -> None:
-    driver = _new_driver(download_path, chrome_binary)
-    win0, win1 = _open_two_windows(driver)
+    """
+    Runs one sample through the TDDev client's HTTP API.  GET /clear and
+    POST /textgen do exactly what the Clear-Cache and Generate buttons
+    did, without DOM latency or stale-element risk.
+    """
+    # keep the bolt.diy tab focused – it performs the actual generation
+    driver.switch_to.window(bolt_handle)
+
+    # route downloads on the live session – one CDP roundtrip instead of
+    # rebuilding the driver to change the download folder
+    driver.execute_cdp_cmd(
+        "Page.setDownloadBehavior",
+        {"behavior": "allow", "downloadPath": os.path.abspath(DOWNLOAD_PATH)},
+    )
 
+    # Clear cached prompt/requirement files (was the Clear-Cache button)
+    try:
+        requests.get(TDDEV_CLIENT_ADDRESS + "clear", timeout=30)
+    except requests.RequestException:
+        pass  # cache clearing is best-effort, exactly as before
+
+    # Submit prompt + model (was textarea + Generate); the route blocks
+    # through requirement generation, so give it a long timeout
+    resp = requests.post(
+        TDDEV_CLIENT_ADDRESS + "textgen",
+        json={"prompt": instruction, "model": "qwen3coder_s"},
+        timeout=TIMEOUT_MIN * 60,
+    )
+    resp.raise_for_status()
+
+    # Wait until the backend actually finishes instead of sleeping the
+    # full timeout: a filesystem watch wakes us the instant the zip-log
+    # file lands, and /status is probed every few seconds as a liveness
+    # check on the client app.
+    print(f"Waiting for backend (max. {TIMEOUT_MIN} min)…")
+    done = threading.Event()
+    watch_dir = os.path.dirname(os.path.abspath(LAST_ZIP_LOG_PATH)) or "."
+    observer = Observer()
+    observer.schedule(_ZipLogHandler(LAST_ZIP_LOG_PATH, done), watch_dir)
+    observer.start()
     try:
-        driver.switch_to.window(win1)
-        wait = WebDriverWait(driver, 30)
-
-        # Clear cache if possible
-        try:
-            clear_btn = wait.until(
-                EC.presence_of_element_located((By.ID, "clear-cache-btn"))
-            )
-            if clear_btn.is_displayed() and clear_btn.is_enabled():
-                clear_btn.click()
-                wait.until(EC.staleness_of(clear_btn))
-                wait.until(EC.presence_of_element_located((By.ID, "prompt")))
-        except Exception:
-            pass  # button may be absent
-
-        # Select model if dropdown is enabled
-        try:
-            model_sel = wait.until(EC.presence_of_element_located((By.ID, "model")))
-            if model_sel.is_enabled():
-                Select(model_sel).select_by_value("qwen3coder_s")
-        except Exception:
-            print("⚠️  Could not select model; proceeding with default.")
-
-        prompt_el = wait.until(EC.presence_of_element_located((By.ID, "prompt")))
-        prompt_el.clear()
-        prompt_el.send_keys(instruction)
-
-        gen_btn = wait.until(EC.element_to_be_clickable((By.ID, "submit-btn")))
-        gen_btn.click()
-
-        print("Waiting for backend (max. 30 min)…")
-        time.sleep(TIMEOUT_MIN * 60)
-
-        # Retrieve ZIP path from log file
         if os.path.isfile(LAST_ZIP_LOG_PATH):
-            with open(LAST_ZIP_LOG_PATH, "r", encoding="utf-8") as f:
-                last_zip = f.read().strip()
-            if last_zip and os.path.isfile(last_zip):
-                dest = os.path.join(output_dir, f"{test_id}.zip")
-                shutil.copy(last_zip, dest)
-                print(f"Copied output zip to: {dest}")
-            os.remove(LAST_ZIP_LOG_PATH)
-
+            done.set()  # landed before the watch started
+        deadline = time.time() + TIMEOUT_MIN * 60
+        while time.time() < deadline and not done.is_set():
+            if done.wait(timeout=5.0):
+                break
+            try:
+                requests.get(TDDEV_CLIENT_ADDRESS + "status", timeout=5)
+            except requests.RequestException:
+                print("⚠️  Client app stopped responding.")
+                break
     finally:
-        driver.quit()
+        observer.stop()
+        observer.join()
+    if not os.path.isfile(LAST_ZIP_LOG_PATH):
+        print("⚠️  Backend did not finish within the timeout.")
+
+    # Retrieve ZIP path from log file
+    if os.path.isfile(LAST_ZIP_LOG_PATH):
+        with open(LAST_ZIP_LOG_PATH, "r", encoding="utf-8") as f:
+            last_zip = f.read().strip()
+        if last_zip and os.path.isfile(last_zip):
+            dest = os.path.join(output_dir, f"{test_id}.zip")
+            try:
+                # downloads and outputs share a filesystem, so this is a
+                # free rename instead of rewriting every byte of the zip
+                os.replace(last_zip, dest)
+            except OSError:
+                shutil.copy2(last_zip, dest)
+                os.remove(last_zip)
+            print(f"Moved output zip to: {dest}")
+        os.remove(LAST_ZIP_LOG_PATH)
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -337,60 +449,141 @@ user instruction: {instruction}
 # ──────────────────────────────────────────────────────────────────────────────
 # Main driver
 # ──────────────────────────────────────────────────────────────────────────────
-def main() -> None:
-    in_file = r"data\test.json"
-    with open(in_file, "r", encoding="utf-8") as f:
-        datas = json.load(f)
-
-    for data in tqdm(datas):
-        test_id = data["id"]
-        print(f"\n================  Running test {test_id}  ================\n")
-
-        if os.path.isfile(os.path.join(OUTPUT_DIR, f"{test_id}.zip")):
-            print("Result already exists → skipping.")
-            continue
-
-        # ─── set up Postgres via Docker ───────────────────────────────
-        working_dir = os.path.join(WORKING_DIR, test_id)
-        log_dir = os.path.join(LOG_DIR, test_id)
-        compose_path = os.path.join(log_dir, "docker-compose.yml")
-        db_dir = os.path.join(log_dir, "db")
-        DB_PORT = 5432
-
-        create_docker_compose_file(
-            working_dir, log_dir, compose_path, db_dir, db_port=DB_PORT
-        )
-        stop_docker_containers(compose_path)
-        free_docker_port(DB_PORT)
-        start_docker_containers(compose_path)
+# per-worker state: every pool process gets its own ports, download dir,
+# zip-log path and (lazily) its own long-lived Chrome session and client app
+_DRIVER: webdriver.Chrome | None = None
+_BOLT_HANDLE: str | None = None
+_CLIENT_PROC: _mp.Process | None = None
+
+
+def _init_worker(index_queue) -> None:
+    """Pool initializer: claim a worker slot and derive per-worker paths/ports."""
+    global CLIENT_PORT, DB_PORT, BOLT_DIY_ADDRESS, TDDEV_CLIENT_ADDRESS
+    global DOWNLOAD_PATH, LAST_ZIP_LOG_PATH
+
+    idx = index_queue.get()
+    CLIENT_PORT = 8003 + idx
+    DB_PORT = 5432 + idx
+    BOLT_DIY_ADDRESS = f"http://localhost:{5173 + idx}/"
+    TDDEV_CLIENT_ADDRESS = f"http://127.0.0.1:{CLIENT_PORT}/"
+    DOWNLOAD_PATH = os.path.join(DOWNLOAD_PATH, f"worker_{idx}")
+    LAST_ZIP_LOG_PATH = os.path.abspath(
+        os.path.join("client", f"last_zip_path_log_{idx}.txt")
+    )
+    os.makedirs(DOWNLOAD_PATH, exist_ok=True)
+
+
+def _run_one(data: dict) -> None:
+    global _DRIVER, _BOLT_HANDLE, _CLIENT_PROC
+
+    test_id = data["id"]
+    print(f"\n================  Running test {test_id}  ================\n")
+
+    if os.path.isfile(os.path.join(OUTPUT_DIR, f"{test_id}.zip")):
+        print("Result already exists → skipping.")
+        return
 
-        # ─── start client-app service ────────────────────────────────
-        client_proc = _start_client_app()
+    # one Chrome session per worker – relaunching per sample costs several
+    # seconds of browser cold-start each time
+    if _DRIVER is None:
+        _DRIVER = _new_driver(DOWNLOAD_PATH, CHROME_BINARY)
+        _BOLT_HANDLE = _open_bolt_window(_DRIVER)
+        atexit.register(_DRIVER.quit)
+
+    # the client service is stateless between samples (its state lives in
+    # the zip-log file), so start it once per worker and keep it running
+    if _CLIENT_PROC is None:
+        _CLIENT_PROC = _start_client_app()
         try:
             wait_until_client_ready(timeout_sec=60)
         except TimeoutError as e:
-            _stop_client_app(client_proc)
-            raise RuntimeError(
-                "Client app failed to start; aborting this sample."
-            ) from e
+            _stop_client_app(_CLIENT_PROC)
+            _CLIENT_PROC = None
+            raise RuntimeError("Client app failed to start.") from e
+        atexit.register(lambda: _stop_client_app(_CLIENT_PROC))
+
+    # a stale zip log from a crashed sample must not leak into this one
+    if os.path.isfile(LAST_ZIP_LOG_PATH):
+        os.remove(LAST_ZIP_LOG_PATH)
+
+    # ─── set up Postgres via Docker ───────────────────────────────
+    working_dir = os.path.join(WORKING_DIR, test_id)
+    log_dir = os.path.join(LOG_DIR, test_id)
+    compose_path = os.path.join(log_dir, "docker-compose.yml")
+    db_dir = os.path.join(log_dir, "db")
+
+    create_docker_compose_file(
+        working_dir, log_dir, compose_path, db_dir, db_port=DB_PORT
+    )
+    stop_docker_containers(compose_path)
+    free_docker_port(DB_PORT)
+    start_docker_containers(compose_path)
 
-        # ─── run Selenium interaction ────────────────────────────────
-        prompt = fullstack_prompt_template.format(instruction=data["instruction"])
-        try:
-            run_single_instruction(
-                prompt,
-                test_id=test_id,
-                download_path=DOWNLOAD_PATH,
-                output_dir=OUTPUT_DIR,
-            )
-        finally:
-            # Always stop client & DB, even on error
-            _stop_client_app(client_proc)
-            stop_docker_containers(compose_path)
-
-        # ─── cool-down before next sample ─────────────────────────────
-        print(f"Waiting {WAIT_AFTER_STOP_SEC}s before next sample…")
-        time.sleep(WAIT_AFTER_STOP_SEC)
+    # ─── run interaction against the long-lived client ───────────
+    prompt = fullstack_prompt_template.format(instruction=data["instruction"])
+    try:
+        run_single_instruction(
+            _DRIVER,
+            _BOLT_HANDLE,
+            prompt,
+            test_id=test_id,
+            output_dir=OUTPUT_DIR,
+        )
+    finally:
+        # Always stop the DB, even on error; the client app stays up
+        stop_docker_containers(compose_path)
+
+    # ─── cool-down before next sample ─────────────────────────────
+    # the fixed cool-down is only a safety bound: what actually matters is
+    # that the compose stack is down, which is observable in well under a
+    # second (the client app now stays up between samples)
+    print(f"Waiting for services to stop (max {WAIT_AFTER_STOP_SEC}s)…")
+    deadline = time.time() + WAIT_AFTER_STOP_SEC
+    while time.time() < deadline:
+        compose_ps = subprocess.run(
+            ["docker", "compose", "-f", compose_path, "ps", "-q"],
+            capture_output=True,
+        )
+        if compose_ps.stdout.strip() == b"":
+            break
+        time.sleep(0.2)
+
+
+def main() -> None:
+    in_file = r"data\test.json"
+    datas = orjson.loads(Path(in_file).read_bytes())
+
+    # the Postgres image is built locally (no registry namespace), so check
+    # it exists once up front and fail fast with a hint instead of letting
+    # every sample's compose up fail the same way
+    image_check = subprocess.run(
+        ["docker", "image", "inspect", "webgen-agent-postgres:latest"],
+        capture_output=True,
+    )
+    if image_check.returncode != 0:
+        raise SystemExit(
+            "Docker image webgen-agent-postgres:latest not found locally. "
+            "Build it before running (see the webgen-agent Dockerfile)."
+        )
+
+    # drop finished samples before they ever reach a worker, so skips cost
+    # nothing instead of a docker up/down cycle
+    already_done = {p.stem for p in Path(OUTPUT_DIR).glob("*.zip")}
+    datas = [d for d in datas if d["id"] not in already_done]
+
+    # samples only wait on the backend, so K workers – each with its own
+    # client port, DB port and download dir – overlap that idle time
+    manager = _mp.Manager()
+    index_queue = manager.Queue()
+    for idx in range(MAX_WORKERS):
+        index_queue.put(idx)
+
+    with ProcessPoolExecutor(
+        max_workers=MAX_WORKERS,
+        initializer=_init_worker,
+        initargs=(index_queue,),
+    ) as ex:
+        list(tqdm(ex.map(_run_one, datas), total=len(datas)))
 
 
 if __name__ == "__main__":
@@ -29,8 +29,8 @@ import sys
 import json
 import argparse
 import traceback
+import multiprocessing as mp
 from pathlib import Path
-from functools import partial
 from typing import List, Dict
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
@@ -43,29 +43,45 @@ project_root = os.path.abspath(os.path.dirname(__file__))
 sys.path.insert(0, project_root)
 from agent import WebGenAgent
 
-from sandbox import create_docker_compose_file, start_docker_containers, stop_docker_containers, free_docker_port
+from sandbox import create_docker_compose_file, start_docker_containers, stop_docker_containers, free_docker_port, compose_project_exists, reset_client
 
 # -----------------------------------------------------------------------------#
 #  helpers
 # -----------------------------------------------------------------------------#
-def load_jsonl(in_file: str) -> List[Dict]:
-    """Safely read a JSONL file into a list (empty list if file missing)."""
+
+# completed records are flushed to disk every this many samples (results
+# also land on close, so a lower value only tightens crash-restart loss)
+FLUSH_EVERY = 16
+
+# C-implemented codec for the hot read/write paths; records can hold full
+# LLM transcripts, where stdlib json is several times slower
+try:
+    import orjson
+
+    _loads = orjson.loads
+
+    def _dumps(obj: Dict) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+except ImportError:  # stdlib fallback keeps the driver runnable anywhere
+    _loads = json.loads
+
+    def _dumps(obj: Dict) -> bytes:
+        return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def iter_jsonl(in_file: str):
+    """Lazily yield records from a JSONL file (nothing if file missing)."""
     if not os.path.isfile(in_file):
-        return []
-    data = []
-    with open(in_file, "r", encoding="utf-8") as f:
+        return
+    with open(in_file, "rb") as f:
         for line in f:
             if line.strip():
-                data.append(json.loads(line))
-    return data
+                yield _loads(line)
 
 
-def save_jsonl(records: List[Dict], out_file: str, mode: str = "a") -> None:
-    """Append / write records (list of dicts) to JSONL."""
-    os.makedirs(os.path.dirname(out_file), exist_ok=True)
-    with open(out_file, mode, encoding="utf-8") as f:
-        for rec in records:
-            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+def load_jsonl(in_file: str) -> List[Dict]:
+    """Eager variant of :func:`iter_jsonl` for callers that need a list."""
+    return list(iter_jsonl(in_file))
 
 # -----------------------------------------------------------------------------#
 #  argument parser
@@ -90,7 +106,9 @@ def build_parser() -> argparse.ArgumentParser:
                         help="Maximum reasoning / action iterations (default: 20).")
     parser.add_argument("--num-workers", type=int, default=os.cpu_count(),
                         help="Parallel worker processes "
-                             "(default: number of CPU cores).")
+                             "(default: number of CPU cores). With 1, "
+                             "samples run in-process: no process pool "
+                             "initialized, no fork/pickle overhead.")
     parser.add_argument("--overwrite", action="store_true",
                         help="Overwrite existing workspace/log directory "
                              "if it already exists.")
@@ -104,17 +122,41 @@ def build_parser() -> argparse.ArgumentParser:
 # -----------------------------------------------------------------------------#
 #  worker job – always return a picklable payload
 # -----------------------------------------------------------------------------#
-def process(args_namespace: argparse.Namespace, sample: dict) -> dict:
+
+# invariant across samples — defined once per process instead of being
+# rebuilt inside process() on every call
+_FULLSTACK_PROMPT_TEMPLATE = """Create a website repository based on the given user instruction with these rules: 1. If the site needs dynamic data, include:   - A frontend that fetches all data from backend APIs. No hard-coded or mock data is allowed.   - A backend that connects to an external PostgreSQL database using these exact environment variables:  DB_HOST=localhost, DB_PORT={db_port}, DB_USERNAME=myappuser, DB_PASSWORD=myapppassword, DB_NAME=myapp. Every data operation must hit this database.    2. If the site is strictly static (e.g., marketing or documentation), a backend is not required.    3. Configure the repository's `package.json` file so that the command `npm run install:all` can install dependencies for both the frontend and the backend, and `npm run dev` can concurrently start the frontend and the backend services.    user instruction: {instruction}"""
+
+# set once per worker by _init_worker so args are not re-pickled per task
+_WORKER_ARGS: Dict = {}
+_WORKER_DB_PORT = 5432
+
+
+def _init_worker(args_dict: Dict, index_queue) -> None:
+    """
+    Executor initializer: receive the parsed args once per worker instead
+    of shipping them with every task, and claim a distinct host DB port
+    (5432 + worker slot) so concurrent samples never fight over Postgres.
+    """
+    global _WORKER_ARGS, _WORKER_DB_PORT
+    _WORKER_ARGS = args_dict
+    _WORKER_DB_PORT = 5432 + index_queue.get()
+    # the generated app and any seeding commands run on the host and read
+    # DB_PORT from the environment; children the agent spawns inherit this
+    os.environ["DB_PORT"] = str(_WORKER_DB_PORT)
+    # a forked child must not reuse the parent's Docker daemon socket
+    reset_client()
+
+
+def process(sample: dict) -> dict:
     """
     Run WebGenAgent on a single sample.
     *Never* propagates a non-picklable exception: any error is converted
     to a plain dict (`ok: False`, `error`, `trace`).
     """
-    args = vars(args_namespace)          # Namespace → plain dict
+    args = _WORKER_ARGS
     payload = {"id": sample["id"]}       # Always include the sample id
 
-    fullstack_prompt_template = """Create a website repository based on the given user instruction with these rules: 1. If the site needs dynamic data, include:   - A frontend that fetches all data from backend APIs. No hard-coded or mock data is allowed.   - A backend that connects to an external PostgreSQL database using these exact environment variables:  DB_HOST=localhost, DB_PORT=5432, DB_USERNAME=myappuser, DB_PASSWORD=myapppassword, DB_NAME=myapp. Every data operation must hit this database.    2. If the site is strictly static (e.g., marketing or documentation), a backend is not required.    3. Configure the repository's `package.json` file so that the command `npm run install:all` can install dependencies for both the frontend and the backend, and `npm run dev` can concurrently start the frontend and the backend services.    user instruction: {instruction}"""
-
     try:
         # ---------- per-sample directories ----------
         workspace_dir = os.path.join(args["workspace_root"], sample["id"])
@@ -124,13 +166,18 @@ def process(args_namespace: argparse.Namespace, sample: dict) -> dict:
 
         compose_path = os.path.join(log_dir, f"webgen-agent_{sample['id']}", "docker-compose.yml")
         db_dir = os.path.join(log_dir, "db")
-        DB_PORT = 5432
+        DB_PORT = _WORKER_DB_PORT
         create_docker_compose_file(workspace_dir, log_dir, compose_path, db_dir, db_port=DB_PORT)
-        stop_docker_containers(compose_path)
+        # `docker compose down` costs hundreds of ms of CLI bootstrap even
+        # when nothing is running; only pay it when the project has leftovers
+        if compose_project_exists(compose_path):
+            stop_docker_containers(compose_path)
         free_docker_port(DB_PORT)
         start_docker_containers(compose_path)
 
-        fullstack_prompt = fullstack_prompt_template.format(instruction=sample["instruction"])
+        fullstack_prompt = _FULLSTACK_PROMPT_TEMPLATE.format(
+            instruction=sample["instruction"], db_port=DB_PORT
+        )
 
         # ---------- run the agent ----------
         agent = WebGenAgent(
@@ -186,30 +233,42 @@ def main() -> None:
     # ------------------------------------------------------------------#
     #  restart logic — skip ids already processed
     # ------------------------------------------------------------------#
-    completed_records = load_jsonl(output_file)
-    completed_ids = {rec.get("id") for rec in completed_records}
+    # stream both files: only ids are kept from the finished run, and only
+    # the still-to-do samples are materialized
+    completed_ids = {rec.get("id") for rec in iter_jsonl(output_file)}
 
-    all_samples = load_jsonl(args.data_path)
-    remaining_samples = [s for s in all_samples if s.get("id") not in completed_ids]
+    total_samples = 0
+    remaining_samples = []
+    for s in iter_jsonl(args.data_path):
+        total_samples += 1
+        if s.get("id") not in completed_ids:
+            remaining_samples.append(s)
 
     if not remaining_samples:
         print("All samples already processed. Nothing to do.")
         return
 
-    print(f"Loaded {len(all_samples)} total samples; "
+    print(f"Loaded {total_samples} total samples; "
           f"{len(completed_ids)} already done; "
           f"{len(remaining_samples)} remaining.")
 
-    # Partial so that executor only receives (sample) and not the whole args repeatedly
-    worker = partial(process, args)
+    # One persistent append handle for the whole run: open/close/makedirs
+    # leave the per-sample hot path, and a big buffer plus periodic flush
+    # coalesce writes without giving up incremental saves
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    out_f = open(output_file, "ab", buffering=1 << 20)
+    written = 0
 
-    for sample in tqdm(remaining_samples):
-        payload = worker(sample)
+    def _persist(payload: dict) -> None:
+        nonlocal written
         if payload.get("ok"):
             # Success – persist only the agent’s result
             record = payload["result"]
             record["id"] = payload["id"]
-            save_jsonl([record], output_file, mode="a")
+            out_f.write(_dumps(record))
+            written += 1
+            if written % FLUSH_EVERY == 0:
+                out_f.flush()
         else:
             # Failure – print warning; optionally persist the error payload
             sys.stderr.write(
@@ -220,6 +279,37 @@ def main() -> None:
 
             raise Exception(f"[ERROR] Sample id={payload['id']} failed: {payload['error']}")
 
+    try:
+        # Single-worker runs (debugging, CI) skip the executor entirely: no
+        # fork, no per-task pickling, and exceptions surface natively
+        if args.num_workers <= 1:
+            print("No process pool initialized (num_workers=1).")
+            global _WORKER_ARGS
+            _WORKER_ARGS = vars(args)
+            os.environ["DB_PORT"] = str(_WORKER_DB_PORT)
+            for sample in tqdm(remaining_samples):
+                _persist(process(sample))
+            return
+
+        # Hand each worker the args (and a DB-port slot) once via the
+        # initializer; tasks then only carry the sample itself
+        manager = mp.Manager()
+        index_queue = manager.Queue()
+        for idx in range(args.num_workers):
+            index_queue.put(idx)
+
+        with ProcessPoolExecutor(
+            max_workers=args.num_workers,
+            initializer=_init_worker,
+            initargs=(vars(args), index_queue),
+        ) as ex:
+            futures = {ex.submit(process, s): s["id"] for s in remaining_samples}
+            for fut in tqdm(as_completed(futures), total=len(futures)):
+                _persist(fut.result())
+    finally:
+        out_f.flush()
+        out_f.close()
+
 
 if __name__ == "__main__":
     main()
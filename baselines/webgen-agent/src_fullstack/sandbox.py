@@ -6,16 +6,44 @@ from __future__ import annotations
 
 import os
 import subprocess
+import threading
 import time
 import yaml
 import re
 
 import sys
+from functools import lru_cache
 from typing import List
 
 import docker
 from docker.errors import APIError, DockerException
 
+# one SDK client per process: docker.from_env() re-parses the environment
+# and opens a fresh daemon connection on every call
+_client: docker.DockerClient | None = None
+_client_lock = threading.Lock()
+
+
+def _get_client() -> docker.DockerClient:
+    """Return the shared Docker SDK client, building it once per process."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = docker.from_env()
+    return _client
+
+
+def reset_client() -> None:
+    """Drop the cached client.
+
+    Call from worker-process initializers so a forked child does not share
+    its parent's daemon socket.
+    """
+    global _client
+    with _client_lock:
+        _client = None
+
 
 def free_docker_port(
     port: int,
@@ -48,34 +76,26 @@ def free_docker_port(
     if not (1 <= port <= 65535):
         raise ValueError("port must be an integer between 1 and 65535")
 
-    client = docker.from_env()
+    client = _get_client()
     affected: List[str] = []
 
-    for container in client.containers.list(all=True):
-        # Ports is a dict like {"5432/tcp": [{"HostIp": "0.0.0.0", "HostPort": "5434"}]}
-        ports = container.attrs.get("NetworkSettings", {}).get("Ports") or {}
-        for _container_port, bindings in ports.items():
-            if bindings is None:                        # port not published
-                continue
-            for bind in bindings:                       # may be multiple host ports
-                if int(bind["HostPort"]) == port:
-                    cid = container.id
-                    affected.append(cid)
-                    name = container.name
-                    print(f"→ Container {name} ({cid[:12]}) publishes port {port}")
-
-                    if container.status == "running":
-                        print(f"  • Stopping …")
-                        container.stop(timeout=stop_timeout)
-
-                    if remove:
-                        print(f"  • Removing …")
-                        container.remove()
-                    else:
-                        print(f"  • Left stopped (not removed)")
-
-                    # a container can only publish the same host port once
-                    break
+    # let the daemon do the port matching server-side instead of pulling
+    # every container's attrs across the socket and scanning them here
+    for container in client.containers.list(all=True, filters={"publish": str(port)}):
+        cid = container.id
+        affected.append(cid)
+        name = container.name
+        print(f"→ Container {name} ({cid[:12]}) publishes port {port}")
+
+        if container.status == "running":
+            print(f"  • Stopping …")
+            container.stop(timeout=stop_timeout)
+
+        if remove:
+            print(f"  • Removing …")
+            container.remove()
+        else:
+            print(f"  • Left stopped (not removed)")
 
     if affected:
         print(f"✔ Port {port} freed from {len(affected)} container(s).")
@@ -85,20 +105,52 @@ def free_docker_port(
     return affected
 
 
+def _project_name(compose_path: str) -> str:
+    """
+    Derive the compose project name for *compose_path* the same way compose
+    does: parent directory name, lowercased, restricted to ``[a-z0-9_-]``.
+    """
+    project = os.path.basename(os.path.dirname(os.path.abspath(compose_path)))
+    return re.sub(r"[^a-z0-9_-]", "", project.lower()).lstrip("_-")
+
+
+def compose_project_exists(compose_path: str) -> bool:
+    """
+    Return True if the compose project for *compose_path* still has containers.
+
+    Asking the daemon for the project label is a single API call on the
+    cached client — far cheaper than an unconditional ``docker compose
+    down`` that usually finds nothing.
+    """
+    project = _project_name(compose_path)
+    if not project:
+        return False
+    client = _get_client()
+    containers = client.containers.list(
+        all=True, filters={"label": f"com.docker.compose.project={project}"}
+    )
+    return bool(containers)
+
+
+@lru_cache(maxsize=1024)
 def convert_windows_path_to_linux(path):
     """
     Convert a Windows path to a Linux path if it's detected as a Windows path.
-    
+
+    Pure string-to-string mapping, so results are memoized: the same
+    workspace/log/db roots recur across samples, and on Linux hosts every
+    call is an identity conversion anyway.
+
     Args:
         path (str): The path to convert
         
     Returns:
         str: The converted path if it was Windows style, original path otherwise
     """
-    # Check if this is a Windows path (starts with drive letter like C:\)
-    windows_path_pattern = re.compile(r'^[a-zA-Z]:\\')
-    
-    if windows_path_pattern.match(path):
+    # Check if this is a Windows path (starts with drive letter like C:\);
+    # plain character tests beat re-compiling (or even cache-looking-up) a
+    # regex on every call
+    if len(path) >= 3 and path[1] == ':' and path[2] == '\\' and 'a' <= path[0].lower() <= 'z':
         # Convert backslashes to forward slashes
         linux_path = path.replace('\\', '/')
         
@@ -132,6 +184,39 @@ def write_logging_conf(conf_path: str) -> None:
     print(f"✔ logging.conf written to {conf_path}")
 
 
+# The compose schema is fully static apart from a handful of substitutions,
+# so the file is rendered from this template instead of building a nested
+# dict and running it through PyYAML's pure-Python dumper on every sample.
+_COMPOSE_TMPL = """\
+services:
+  workspace:
+    image: webgen-agent-postgres:latest
+    tty: true
+    stdin_open: true
+    command:
+    - sleep
+    - infinity
+    volumes:
+    - "postgres_data_{sample_id}:/var/lib/postgresql/14/main"
+    - "{conf_path}:/etc/postgresql/14/main/conf.d/90-logging.conf:ro"
+    environment:
+      DB_HOST: localhost
+      DB_PORT: {db_port}
+      DB_USERNAME: myappuser
+      DB_PASSWORD: myapppassword
+      DB_NAME: myapp
+    ports:
+    - "{db_port}:5432"
+volumes:
+  postgres_data_{sample_id}:
+    driver: local
+    driver_opts:
+      type: none
+      o: bind
+      device: "{db_dir}"
+"""
+
+
 def create_docker_compose_file(
     working_dir: str,
     log_dir: str,
@@ -160,49 +245,104 @@ def create_docker_compose_file(
     os.makedirs(db_dir, exist_ok=True)
 
     # ---------- compose content ---------------------------------------------
-    compose_content = {
-        "services": {
-            "workspace": {
-                "image": "webgen-agent-postgres:latest",
-                "tty": True,
-                "stdin_open": True,
-                "command": ["sleep", "infinity"],
-                "volumes": [
-                    f"postgres_data_{sample_id}:/var/lib/postgresql/14/main",
-                    f"{linux_host_conf_path}:/etc/postgresql/14/main/conf.d/90-logging.conf:ro",
-                ],
-                "environment": {
-                    "DB_HOST": "localhost",
-                    "DB_PORT": db_port,
-                    "DB_USERNAME": "myappuser",
-                    "DB_PASSWORD": "myapppassword",
-                    "DB_NAME": "myapp",
-                },
-                "ports": [f"{db_port}:5432"],
-            }
-        },
-        "volumes": {
-            f"postgres_data_{sample_id}": {
-                "driver": "local",
-                "driver_opts": {
-                    "type": "none",
-                    "o": "bind",
-                    "device": linux_db_dir,
-                },
-            }
-        },
-    }
+    compose_content = _COMPOSE_TMPL.format(
+        sample_id=sample_id,
+        db_port=db_port,
+        conf_path=linux_host_conf_path,
+        db_dir=linux_db_dir,
+    )
 
     os.makedirs(os.path.dirname(compose_path), exist_ok=True)
     with open(compose_path, "w", encoding="utf-8") as fh:
-        yaml.dump(compose_content, fh, default_flow_style=False, sort_keys=False)
+        fh.write(compose_content)
 
     print(f"✔ docker-compose file written to {compose_path}")
 
 
+def _resolve_service_spec(compose_path: str) -> dict:
+    """
+    Translate the single-service compose file at *compose_path* into kwargs
+    for ``client.containers.run``.  Named volumes that are bind-mounts in
+    disguise (``driver_opts: {type: none, o: bind}``) are resolved to the
+    underlying host directory, so the DB data dir lands in the same place
+    the compose CLI would put it.
+    """
+    with open(compose_path, "r", encoding="utf-8") as fh:
+        spec = yaml.safe_load(fh)
+
+    service = spec["services"]["workspace"]
+    named_volumes = spec.get("volumes") or {}
+
+    volumes: dict = {}
+    for entry in service.get("volumes", []):
+        parts = entry.split(":")
+        if len(parts) == 2:
+            source, target, mode = parts[0], parts[1], "rw"
+        else:
+            # windows drive letters never reach here – paths were already
+            # converted when the compose file was written
+            source, target, mode = parts[0], parts[1], parts[2]
+        if source in named_volumes:
+            source = named_volumes[source]["driver_opts"]["device"]
+        volumes[source] = {"bind": target, "mode": mode}
+
+    ports: dict = {}
+    for mapping in service.get("ports", []):
+        host_port, container_port = str(mapping).split(":")
+        ports[f"{container_port}/tcp"] = int(host_port)
+
+    return {
+        "image": service["image"],
+        "command": service.get("command"),
+        "environment": {k: str(v) for k, v in (service.get("environment") or {}).items()},
+        "volumes": volumes,
+        "ports": ports,
+        "tty": service.get("tty", False),
+        "stdin_open": service.get("stdin_open", False),
+    }
+
+
 def start_docker_containers(compose_path: str):
-    """Start Docker containers using the compose file"""
+    """Start Docker containers for the compose file, talking to the daemon
+    directly through the cached SDK client.  Each ``docker compose up`` costs
+    a fork/exec, CLI bootstrap and fresh daemon session (~0.5–1.5 s); the SDK
+    path reuses one socket.  Falls back to the CLI on any SDK failure."""
     print("Starting Docker containers...")
+    project = _project_name(compose_path)
+    try:
+        run_kwargs = _resolve_service_spec(compose_path)
+        client = _get_client()
+        name = f"{project}-workspace-1"
+
+        # replace any leftover container occupying the compose-style name
+        try:
+            stale = client.containers.get(name)
+            if stale.status == "running":
+                stale.stop(timeout=5)
+            stale.remove(v=True)
+        except docker.errors.NotFound:
+            pass
+
+        # carry the compose project label so compose_project_exists() and a
+        # CLI `docker compose down --remove-orphans` both still see it
+        client.containers.run(
+            detach=True,
+            name=name,
+            labels={
+                "com.docker.compose.project": project,
+                "com.docker.compose.service": "workspace",
+            },
+            **run_kwargs,
+        )
+        print("Docker containers started successfully")
+        return True
+    except (DockerException, OSError, KeyError, ValueError, yaml.YAMLError) as exc:
+        print(f"SDK start failed ({exc}); falling back to docker compose CLI")
+        return _start_docker_containers_cli(compose_path)
+
+
+def _start_docker_containers_cli(compose_path: str):
+    """CLI fallback: start containers with `docker compose up`."""
     for attempt in range(3):  # Retry up to 3 times
         try:
             result = subprocess.run(["docker", "compose", "-f", compose_path, "up", "-d", "--remove-orphans"], 
@@ -227,8 +367,43 @@ def start_docker_containers(compose_path: str):
 
 
 def stop_docker_containers(compose_path: str):
-    """Stop Docker containers using the compose file"""
+    """Stop and remove the containers of the compose project at
+    *compose_path*, going straight to the daemon via the cached SDK client.
+    Works for containers created by either the SDK start path or the compose
+    CLI (both carry the project label).  Falls back to `docker compose down`
+    if the SDK path fails."""
     print("Stopping Docker containers...")
+    project = _project_name(compose_path)
+    try:
+        client = _get_client()
+        containers = client.containers.list(
+            all=True, filters={"label": f"com.docker.compose.project={project}"}
+        )
+        for container in containers:
+            if container.status == "running":
+                container.stop(timeout=5)
+            container.remove(v=True)
+        # ``remove(v=True)`` only deletes anonymous volumes; the named
+        # volumes the compose CLI creates (``{project}_<name>``) carry the
+        # project label and must be removed explicitly or they leak one per
+        # sample. They are bind-mounts in disguise, so only the volume
+        # object goes — the host data dir stays put.
+        for volume in client.volumes.list(
+            filters={"label": f"com.docker.compose.project={project}"}
+        ):
+            try:
+                volume.remove()
+            except docker.errors.APIError as exc:
+                print(f"Could not remove volume {volume.name}: {exc}")
+        print("Docker containers stopped successfully")
+        return True
+    except (DockerException, OSError) as exc:
+        print(f"SDK stop failed ({exc}); falling back to docker compose CLI")
+        return _stop_docker_containers_cli(compose_path)
+
+
+def _stop_docker_containers_cli(compose_path: str):
+    """CLI fallback: tear the project down with `docker compose down`."""
     try:
         # First try to stop gracefully
         subprocess.run(["docker", "compose", "-f", compose_path, "down", "-v", "--remove-orphans"], check=True, timeout=30)
@@ -1,5 +1,6 @@
 import os
 import base64
+import mmap
 
 import sys
 project_root = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
@@ -9,17 +10,50 @@ from prompts import system_prompt
 from utils import vlm_generation
 
 import json
-import re
 from typing import Dict
 
+def _extract_json_object(output_str: str) -> str:
+    """Return the first balanced {...} block in *output_str*, or '' if none.
+
+    Single linear scan with a brace-depth counter (string literals and
+    backslash escapes are honored so braces inside JSON strings don't
+    miscount) — a DOTALL `\\{.*\\}` regex backtracks over the whole
+    response on every call, which hurts on long VLM outputs.
+    """
+    start = output_str.find('{')
+    if start < 0:
+        return ""
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(output_str)):
+        ch = output_str[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return output_str[start:i + 1]
+    # unbalanced — fall back to everything from the first brace on,
+    # matching the old regex's greedy behavior as closely as possible
+    return output_str[start:]
+
+
 def parse_screenshot_output(output_str: str) -> Dict[str, object]:
     # 1) Extract JSON block (handles optional Markdown/code fences)
-    match = re.search(r"\{.*\}", output_str, flags=re.DOTALL)
-    if not match:
+    json_str = _extract_json_object(output_str)
+    if not json_str:
         print("No JSON object found in the input string.")
 
-    json_str = match.group(0)
-
     data = {}
     # 2) Parse JSON into Python dict
     try:
@@ -37,8 +71,15 @@ def parse_screenshot_output(output_str: str) -> Dict[str, object]:
 
 
 def encode_image(image_path):
+  # base64-encode straight from an mmap of the file: no whole-file read()
+  # copy, and .decode('ascii') skips UTF-8 validation (base64 is ASCII)
   with open(image_path, "rb") as image_file:
-    return base64.b64encode(image_file.read()).decode('utf-8')
+    try:
+      with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return base64.b64encode(mm).decode('ascii')
+    except (ValueError, OSError):
+      # empty file or filesystem without mmap support
+      return base64.b64encode(image_file.read()).decode('ascii')
 
 
 screenshot_prompt = """You are given a single website screenshot as input.
@@ -1,4 +1,6 @@
 import os
+import random
+import time
 import openai
 from openai import OpenAI
 from dotenv import load_dotenv
@@ -15,47 +17,42 @@ client = OpenAI(api_key=os.environ["OPENAILIKE_API_KEY"],
 
 print(os.environ["OPENAILIKE_BASE_URL"])
 
+# without a timeout one stuck request stalls a worker forever, and without
+# retries a transient 429/5xx fails the whole sample
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "5"))
+LLM_REQUEST_TIMEOUT = float(os.environ.get("LLM_REQUEST_TIMEOUT", "600"))
+
+
 def llm_generation(messages, model, max_tokens=-1, max_completion_tokens=-1, temperature=0.5):
     if model == "/mnt/cache/code/models/Qwen3-Coder-480B-A35B-Instruct-FP8":
         model = "model"
+
+    kwargs = {
+        "model": model,
+        "messages": messages,
+        "timeout": LLM_REQUEST_TIMEOUT,
+    }
     if temperature > 0:
-        if max_tokens > 0:
-            chat_response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-        elif max_completion_tokens > 0:
-            chat_response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_completion_tokens=max_completion_tokens,
-            )
-        else:
-            chat_response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-            )
-    else:
-        if max_tokens > 0:
-            chat_response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens,
-            )
-        elif max_completion_tokens > 0:
-            chat_response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_completion_tokens=max_completion_tokens,
-            )
-        else:
-            chat_response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-            )
-
-    return chat_response.choices[0].message.content
\ No newline at end of file
+        kwargs["temperature"] = temperature
+    if max_tokens > 0:
+        kwargs["max_tokens"] = max_tokens
+    elif max_completion_tokens > 0:
+        kwargs["max_completion_tokens"] = max_completion_tokens
+
+    for attempt in range(LLM_MAX_RETRIES):
+        try:
+            chat_response = client.chat.completions.create(**kwargs)
+            return chat_response.choices[0].message.content
+        # only transient failures are worth retrying: connection drops,
+        # 429s, and 5xx. Other status errors (bad request, auth, context
+        # overflow) are deterministic and re-raise immediately
+        except (
+            openai.APIConnectionError,
+            openai.RateLimitError,
+            openai.InternalServerError,
+        ) as e:
+            if attempt == LLM_MAX_RETRIES - 1:
+                raise
+            delay = min(2 ** attempt + random.random(), 30)
+            print(f"LLM call failed ({e}); retry {attempt + 1}/{LLM_MAX_RETRIES - 1} in {delay:.1f}s")
+            time.sleep(delay)
\ No newline at end of file
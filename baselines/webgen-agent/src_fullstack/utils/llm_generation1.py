@@ -1,4 +1,5 @@
 import os
+import httpx
 import openai
 from openai import OpenAI
 from dotenv import load_dotenv
@@ -10,14 +11,32 @@ sys.path.insert(0, project_root)
 
 from prompts.system import system_prompt
 
-client = OpenAI(api_key=os.environ["OPENAILIKE_API_KEY"], 
-                base_url=os.environ["OPENAILIKE_BASE_URL"])
+# one client per process, built lazily: a client forked from the parent
+# would share TLS/connection state with its siblings, so the cache is keyed
+# on pid. The explicit httpx pool keeps connections alive across requests.
+_client = None
+_client_pid = None
+
+
+def _get_client() -> OpenAI:
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = OpenAI(
+            api_key=os.environ["OPENAILIKE_API_KEY"],
+            base_url=os.environ["OPENAILIKE_BASE_URL"],
+            http_client=httpx.Client(
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                timeout=60.0,
+            ),
+        )
+        _client_pid = os.getpid()
+    return _client
 
 
 def llm_generation(messages, model):
-    chat_response = client.chat.completions.create(
+    chat_response = _get_client().chat.completions.create(
         model=model,
         messages=messages
     )
 
-    return chat_response.choices[0].message.content
\ No newline at end of file
+    return chat_response.choices[0].message.content
@@ -14,5 +14,6 @@ __all__ = [
     "start_docker_containers",
     "stop_docker_containers",
     "convert_windows_path_to_linux",
-    "llm_generation"
+    "llm_generation",
+    "parse_json_response"
 ]
\ No newline at end of file
@@ -1,19 +1,25 @@
 import re
+from functools import lru_cache
 
+# Matches a Windows path (starts with drive letter like C:\)
+_WINDOWS_PATH_RE = re.compile(r'^[a-zA-Z]:\\')
+
+
+@lru_cache(maxsize=256)
 def convert_windows_path_to_linux(path):
     """
     Convert a Windows path to a Linux path if it's detected as a Windows path.
-    
+
+    Pure mapping, so results are memoized — the same workspace/log/project
+    roots are converted over and over across sessions.
+
     Args:
         path (str): The path to convert
-        
+
     Returns:
         str: The converted path if it was Windows style, original path otherwise
     """
-    # Check if this is a Windows path (starts with drive letter like C:\)
-    windows_path_pattern = re.compile(r'^[a-zA-Z]:\\')
-    
-    if windows_path_pattern.match(path):
+    if _WINDOWS_PATH_RE.match(path):
         # Convert backslashes to forward slashes
         linux_path = path.replace('\\', '/')
         
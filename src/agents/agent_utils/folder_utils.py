@@ -13,49 +13,45 @@ IGNORED_DIRS = {
 
 def get_folder_structure(root_path: str, max_depth: int = 3) -> str:
     """Get a textual representation of the folder structure."""
-    def _get_structure(path: str, prefix: str = "", is_last: bool = True, depth: int = 0) -> List[str]:
-        if depth > max_depth:
-            return []
-            
-        if not os.path.exists(path):
-            return []
-            
-        lines = []
-        basename = os.path.basename(path) if path != root_path else "."
-        
-        # Skip ignored directories
-        if basename in IGNORED_DIRS:
+    _by_name = lambda e: e.name
+
+    def _scan(path: str):
+        # one scandir pass that classifies as it goes: DirEntry knows its
+        # own type, so no extra isdir/isfile stat calls per child
+        dirs: List[os.DirEntry] = []
+        files: List[os.DirEntry] = []
+        with os.scandir(path) as it:
+            for e in it:
+                if e.name in IGNORED_DIRS:
+                    continue
+                if e.is_dir():
+                    dirs.append(e)
+                elif e.is_file():
+                    files.append(e)
+        # dirs first, each group sorted by name – same order as before
+        dirs.sort(key=_by_name)
+        files.sort(key=_by_name)
+        return dirs, files
+
+    def _walk_dir(path: str, prefix: str, depth: int) -> List[str]:
+        """Emit tree lines for the children of *path* (a known directory)."""
+        if depth >= max_depth:
             return []
-        
-        # Add current directory
-        if depth > 0:
-            connector = "└── " if is_last else "├── "
-            lines.append(f"{prefix}{connector}{basename}")
-            
-        # Update prefix for children
-        if depth > 0:
-            extension = "    " if is_last else "│   "
-            child_prefix = prefix + extension
-        else:
-            child_prefix = ""
-            
-        # Process children
         try:
-            if os.path.isdir(path):
-                items = sorted(os.listdir(path))
-                dirs = [item for item in items if os.path.isdir(os.path.join(path, item)) and item not in IGNORED_DIRS]
-                files = [item for item in items if os.path.isfile(os.path.join(path, item))]
-                
-                # Combine dirs and files, dirs first
-                all_items = dirs + files
-                for i, item in enumerate(all_items):
-                    item_path = os.path.join(path, item)
-                    is_last_item = (i == len(all_items) - 1)
-                    lines.extend(_get_structure(item_path, child_prefix, is_last_item, depth + 1))
+            dirs, files = _scan(path)
         except PermissionError:
-            lines.append(f"{child_prefix}└── [Permission Denied]")
-            
+            return [f"{prefix}└── [Permission Denied]"]
+
+        lines = []
+        last = len(dirs) + len(files) - 1
+        for i, entry in enumerate(dirs):
+            is_last = (i == last)
+            lines.append(f"{prefix}{'└── ' if is_last else '├── '}{entry.name}")
+            lines.extend(_walk_dir(entry.path, prefix + ("    " if is_last else "│   "), depth + 1))
+        for j, entry in enumerate(files, start=len(dirs)):
+            lines.append(f"{prefix}{'└── ' if j == last else '├── '}{entry.name}")
         return lines
-        
-    structure_lines = _get_structure(root_path)
-    return "\n".join(structure_lines)
\ No newline at end of file
+
+    if not os.path.isdir(root_path):
+        return ""
+    return "\n".join(_walk_dir(root_path, "", 0))
\ No newline at end of file
@@ -1,11 +1,24 @@
 """
 Logging utilities for Qwen Code Python implementation.
+
+Set AGENT_LOG_ECHO=1 to also echo session log lines to stdout (off by
+default: with many parallel workers every echoed line contends on the
+shared terminal).
 """
 import os
 import json
+import atexit
+import queue
+import threading
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 
+try:
+    # C-implemented encoder; log entries carry whole LLM transcripts
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class SessionLogger:
     """Logger for session data."""
@@ -16,7 +29,99 @@ class SessionLogger:
         self.session_name = os.path.basename(self.log_dir)
         if not os.path.exists(self.log_dir):
             os.makedirs(self.log_dir, exist_ok=True)
-        
+        self._echo_stdout = bool(int(os.environ.get("AGENT_LOG_ECHO", "0")))
+        # dirs already created this session: _write_log runs per entry, and
+        # re-stat/mkdir-ing the same two subdirs hundreds of times is waste
+        self._created_dirs = {self.log_dir}
+        # All file I/O goes through a background thread: log_message and the
+        # per-step JSON dumps are called from the agent's hot loop, and the
+        # blocking open/write/close per entry otherwise serializes the main
+        # thread on the filesystem. Entries are serialized to bytes at call
+        # time (callers pass live dicts by reference), so only the writes
+        # themselves move off-thread. One daemon thread owns the handles and
+        # flushes once per drained burst.
+        self._queue = queue.Queue(maxsize=10000)
+        self._log_fh = open(self.log_file, "a", encoding="utf-8", buffering=1 << 16)
+        # every entry also lands in one append-only session.ndjson: a
+        # 20-iteration run otherwise produces 40+ tiny per-step files, each
+        # paying its own open/write/close metadata round-trip. Set
+        # per_step_files = False to keep only the aggregate.
+        self.per_step_files = True
+        self._aggregate_fh = open(
+            os.path.join(self.log_dir, "session.ndjson"), "ab", buffering=1 << 16
+        )
+        # start the writer only once both handles it owns exist
+        self._writer = threading.Thread(target=self._drain, daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _drain(self):
+        """Background writer: batch queued items and flush once per burst."""
+        while True:
+            item = self._queue.get()
+            stop = False
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                try:
+                    self._write_item(item)
+                except Exception:
+                    # a failed write (disk full, closed handle) drops the
+                    # entry, never the thread: if this loop dies the queue
+                    # fills and _enqueue's blocking put deadlocks the agent
+                    pass
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            # flushes are suppressed independently so one failing sink
+            # cannot starve the other
+            try:
+                self._log_fh.flush()
+            except Exception:
+                pass
+            try:
+                self._aggregate_fh.flush()
+            except Exception:
+                pass
+            if stop:
+                return
+
+    def _write_item(self, item):
+        """Dispatch one queued entry; runs on the writer thread only."""
+        if isinstance(item, str):
+            self._log_fh.write(item)
+            return
+        path, payload = item
+        if path is None:
+            self._aggregate_fh.write(payload)
+        else:
+            with open(path, "wb") as f:
+                f.write(payload)
+
+    def _enqueue(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # backpressure: block until the writer catches up
+            self._queue.put(item)
+
+    def close(self):
+        """Flush pending log lines; also runs automatically at exit."""
+        if self._log_fh.closed:
+            return
+        try:
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+            self._log_fh.flush()
+            self._log_fh.close()
+            self._aggregate_fh.flush()
+            self._aggregate_fh.close()
+        except Exception:
+            # Silently ignore logging errors
+            pass
+
     def log_llm_request_response(self, 
         step: int, 
         tag: str, 
@@ -48,23 +153,43 @@ class SessionLogger:
         else:
             tag = "[frontend]" if is_frontend else "[backend]"
         log_message = f"[{datetime.now().isoformat()}][{self.session_name}]{tag} {message}"
-        with open(self.log_file, "a", encoding="utf-8") as f:
-            f.write(log_message + "\n")
-        print(log_message)
+        self._enqueue(log_message + "\n")
+        if self._echo_stdout:
+            print(log_message)
         
     def _write_log(self, step: int, tag: str, log_entry: Dict[str, Any], is_frontend: bool = None):
         """Write a log entry to file."""
         if is_frontend is not None:
             sub_dir = "frontend" if is_frontend else "backend"
             log_dir = os.path.join(self.log_dir, sub_dir)
-            if not os.path.exists(log_dir):
+            if log_dir not in self._created_dirs:
                 os.makedirs(log_dir, exist_ok=True)
+                self._created_dirs.add(log_dir)
         else:
             log_dir = self.log_dir
+        # Serialize here — the caller may mutate the referenced dicts as soon
+        # as this returns — but hand the writes to the background thread.
+        try:
+            record = {"step": step, "tag": tag, "is_frontend": is_frontend, **log_entry}
+            if orjson is not None:
+                self._enqueue((None, orjson.dumps(record) + b"\n"))
+            else:
+                self._enqueue(
+                    (None, (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+                )
+        except Exception:
+            # Silently ignore logging errors
+            pass
+
+        if not self.per_step_files:
+            return
         log_file = os.path.join(log_dir, f"{step}_{tag}.json")
         try:
-            with open(log_file, "w", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False, indent=4) + "\n")
+            if orjson is not None:
+                payload = orjson.dumps(log_entry, option=orjson.OPT_INDENT_2) + b"\n"
+            else:
+                payload = (json.dumps(log_entry, ensure_ascii=False, indent=4) + "\n").encode("utf-8")
+            self._enqueue((log_file, payload))
         except Exception:
             # Silently ignore logging errors
             pass
\ No newline at end of file
@@ -1,26 +1,148 @@
 import json
 import re
 
+try:
+    # SIMD-accelerated parser; every tool-call response funnels through here
+    import orjson
+except ImportError:
+    orjson = None
+
+_loads = json.loads if orjson is None else orjson.loads
+
 _JSON_BLOCK_RE = re.compile(r"```json(.*?)```", re.S)
 
-def parse_json_response(raw_text: str):
+
+def _find_json_span(text: str):
+    """
+    Locate the first balanced JSON object or array in *text*.
+
+    One linear pass tracking nesting depth and string/escape state —
+    unlike a greedy ``\\{.*\\}`` regex it neither backtracks nor spans from
+    the first ``{`` to the last ``}`` when several top-level objects exist.
+    Returns ``(start, end)`` slice bounds, or ``None`` if nothing balances.
+    """
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        return None
+    start = min(starts)
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '{[':
+            depth += 1
+        elif ch in '}]':
+            depth -= 1
+            if depth == 0:
+                return (start, i + 1)
+    return None
+
+def _repair_json_source(text: str):
+    """
+    Best-effort single-pass repair of almost-JSON model output.
+
+    Handles the failure modes LLMs actually produce — trailing commas, an
+    unclosed string, unclosed (or mismatched) braces/brackets, and prose
+    before/after the value. Returns the repaired source, or ``None`` when
+    no object/array even starts.
+    """
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        return None
+    out = []
+    closers = []          # expected closer for each open bracket
+    in_string = False
+    escaped = False
+    for ch in text[min(starts):]:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in '{[':
+            closers.append('}' if ch == '{' else ']')
+            out.append(ch)
+        elif ch in '}]':
+            if not closers:
+                break     # stray closer — stop before the junk
+            while out and out[-1] in ' \t\r\n':
+                out.pop()
+            if out and out[-1] == ',':
+                out.pop()  # trailing comma before a closer
+            out.append(closers.pop())  # also fixes a mismatched closer
+            if not closers:
+                break     # top-level value complete; ignore trailing prose
+        else:
+            out.append(ch)
+    if in_string:
+        out.append('"')
+    while out and out[-1] in ' \t\r\n,':
+        out.pop()
+    out.extend(reversed(closers))
+    return "".join(out)
+
+
+def parse_json_response(raw_text):
     """
     Extract the list of data structures from the model's raw response.
-    Returns [] if nothing could be parsed.
+    Accepts str or bytes. Returns [] if nothing could be parsed.
     """
-    # 1) Prefer the fenced ```json ... ``` block
-    match = _JSON_BLOCK_RE.search(raw_text)
-    json_src = match.group(1).strip() if match else raw_text
+    if isinstance(raw_text, (bytes, bytearray)):
+        # both decoders take bytes natively — try before paying a transcode
+        try:
+            return _loads(raw_text)
+        except ValueError:
+            raw_text = raw_text.decode("utf-8", errors="replace")
+    # 1) Prefer the fenced ```json ... ``` block. Literal str.find is a
+    # memchr-style scan in CPython and beats spinning up the regex engine
+    # on this hot path; the regex stays as the fallback for odd fences.
+    json_src = None
+    i = raw_text.find("```json")
+    if i >= 0:
+        j = raw_text.find("```", i + 7)
+        if j >= 0:
+            json_src = raw_text[i + 7:j].strip()
+    if json_src is None:
+        match = _JSON_BLOCK_RE.search(raw_text)
+        json_src = match.group(1).strip() if match else raw_text
 
     try:
-        parsed = json.loads(json_src)
+        parsed = _loads(json_src)
         return parsed
-    except json.JSONDecodeError:
+    except ValueError:  # covers both json and orjson decode errors
         pass  # fall through to next attempt
 
-    # 2) Fallback: try to find a list-like string manually
-    try:
-        parsed = json.loads(re.search(r"\{.*\}", raw_text, re.S).group())
-        return parsed
-    except Exception:
-        return {}
\ No newline at end of file
+    # 2) Fallback: slice out the first balanced object/array manually
+    span = _find_json_span(raw_text)
+    if span is not None:
+        try:
+            return _loads(raw_text[span[0]:span[1]])
+        except Exception:
+            pass
+
+    # 3) Last resort: repair the almost-JSON in place and re-parse — far
+    # cheaper than making the caller regenerate the whole response for a
+    # trailing comma or an unclosed brace.
+    repaired = _repair_json_source(json_src)
+    if repaired is not None:
+        try:
+            return _loads(repaired)
+        except ValueError:
+            pass
+    return {}
@@ -4,59 +4,66 @@ Docker sandbox utilities for running agent sessions.
 """
 
 import hashlib
+import json
 import os
 import time
 import subprocess
-import yaml
+from functools import lru_cache
+
+try:
+    # C-implemented encoder for the compose dump
+    import orjson
+except ImportError:
+    orjson = None
 
 from .convert_path import convert_windows_path_to_linux
 
+# invariant for the life of the process — no need to rebuild them per session
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_LINUX_PROJECT_ROOT = convert_windows_path_to_linux(_PROJECT_ROOT)
+
 
+@lru_cache(maxsize=1024)
 def _hash_name(name: str, length: int = 12) -> str:
     """
-    Return the first `length` hex chars of the SHA-256 digest of `name`.
+    Return a `length`-hex-char BLAKE2s digest of `name`.
 
     The result is
     * deterministic      – same `name` ⇒ same hash every run
     * practically unique – collision probability ≪ 10⁻¹² for `length` ≥ 12
     * Docker-friendly    – lowercase hex, matches `[a-z0-9]+`
-    """
-    return hashlib.sha256(name.encode("utf-8")).hexdigest()[:length]
 
+    BLAKE2s replaces SHA-256 here: these ids only need determinism, not
+    cryptographic strength, and its lighter compression function wins on
+    inputs this short. Callers that already hold bytes may pass them
+    directly and skip the encode.
+    """
+    data = name if isinstance(name, bytes) else name.encode("utf-8")
+    return hashlib.blake2s(data, digest_size=(length + 1) // 2).hexdigest()[:length]
 
-def create_docker_compose_file(working_dir: str, log_dir: str, compose_path: str):
-    """Create a generic Docker Compose file for the agent session."""
-    project_root      = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    linux_project_root = convert_windows_path_to_linux(project_root)
-    linux_log_dir      = convert_windows_path_to_linux(log_dir)
-    linux_working_dir  = convert_windows_path_to_linux(working_dir)
-
-    # ──────────────────────────────────────────────────────────────────
-    # Construct a deterministic hash from the human-readable container name
-    # ──────────────────────────────────────────────────────────────────
-    readable_name   = os.path.basename(os.path.dirname(compose_path))
-    name_hash       = _hash_name(readable_name)          # 12-char hex
-    container_name  = f"container_{name_hash}"     # keep some context
-    volume_prefix   = f"postgres_data_{name_hash}"
-    network_name    = f"webgen_network_{name_hash}"
-    # ──────────────────────────────────────────────────────────────────
 
-    db_dir = os.path.join(log_dir, "db")
-    os.makedirs(db_dir, exist_ok=True)
+def _build_compose_template() -> str:
+    """
+    Render the compose skeleton once at import.
 
-    compose_content = {
+    Only the hash-derived names and a handful of paths vary per session, so
+    each create_docker_compose_file call reduces to a few str.replace()s on
+    this pre-serialized JSON instead of rebuilding and re-dumping the dict.
+    The fixed project-root mount is baked in (escaped by the dump itself).
+    """
+    skeleton = {
         "services": {
             "workspace": {
-                "container_name": container_name,
+                "container_name": "__CONTAINER_NAME__",
                 "image": "webgen-agent-postgres:latest",
                 "tty": True,
                 "stdin_open": True,
                 "command": ["sleep", "infinity"],
                 "volumes": [
-                    f"{working_dir}:{linux_working_dir}",
-                    f"{log_dir}:{linux_log_dir}",
-                    f"{volume_prefix}:/var/lib/postgresql/14/main",
-                    f"{project_root}:{linux_project_root}:ro",
+                    "__WORKING_DIR__:__LINUX_WORKING_DIR__",
+                    "__LOG_DIR__:__LINUX_LOG_DIR__",
+                    "__VOLUME_PREFIX__:/var/lib/postgresql/14/main",
+                    f"{_PROJECT_ROOT}:{_LINUX_PROJECT_ROOT}:ro",
                 ],
                 "environment": {
                     "DB_HOST": "localhost",
@@ -65,59 +72,198 @@ def create_docker_compose_file(working_dir: str, log_dir: str, compose_path: str
                     "DB_PASSWORD": "myapppassword",
                     "DB_NAME": "myapp",
                 },
-                "networks": [network_name],
+                "networks": ["__NETWORK_NAME__"],
             }
         },
         "volumes": {
-            volume_prefix: {
+            "__VOLUME_PREFIX__": {
                 "driver": "local",
                 "driver_opts": {
                     "type": "none",
                     "o": "bind",
-                    "device": db_dir,
+                    "device": "__DB_DIR__",
                 },
             }
         },
         "networks": {
-            network_name: {
+            "__NETWORK_NAME__": {
                 "driver": "bridge",
                 "external": False,
             }
         },
     }
+    # JSON is a YAML subset, so docker compose reads it from the .yml file
+    # unchanged
+    if orjson is not None:
+        return orjson.dumps(skeleton, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(skeleton, indent=2)
+
+
+_COMPOSE_TEMPLATE = _build_compose_template()
+
+# db dirs this process has already created — makedirs stats the whole path
+# even when nothing needs creating, which adds up across many sandboxes
+_CREATED_DB_DIRS = set()
+
+
+def _json_escape(value: str) -> str:
+    """Escape *value* for splicing inside a JSON string literal."""
+    return json.dumps(value)[1:-1]
+
+
+def create_docker_compose_file(working_dir: str, log_dir: str, compose_path: str):
+    """Create a generic Docker Compose file for the agent session."""
+    linux_log_dir      = convert_windows_path_to_linux(log_dir)
+    linux_working_dir  = convert_windows_path_to_linux(working_dir)
+
+    # ──────────────────────────────────────────────────────────────────
+    # Construct a deterministic hash from the human-readable container name
+    # ──────────────────────────────────────────────────────────────────
+    readable_name   = os.path.basename(os.path.dirname(compose_path))
+    name_hash       = _hash_name(readable_name)          # 12-char hex
+    container_name  = f"container_{name_hash}"     # keep some context
+    volume_prefix   = f"postgres_data_{name_hash}"
+    network_name    = f"webgen_network_{name_hash}"
+    # ──────────────────────────────────────────────────────────────────
+
+    db_dir = os.path.join(log_dir, "db")
+    if db_dir not in _CREATED_DB_DIRS:
+        os.makedirs(db_dir, exist_ok=True)
+        _CREATED_DB_DIRS.add(db_dir)
+
+    content = _COMPOSE_TEMPLATE
+    for sentinel, value in (
+        ("__CONTAINER_NAME__", container_name),
+        ("__VOLUME_PREFIX__", volume_prefix),
+        ("__NETWORK_NAME__", network_name),
+        ("__WORKING_DIR__", _json_escape(working_dir)),
+        ("__LINUX_WORKING_DIR__", _json_escape(linux_working_dir)),
+        ("__LOG_DIR__", _json_escape(log_dir)),
+        ("__LINUX_LOG_DIR__", _json_escape(linux_log_dir)),
+        ("__DB_DIR__", _json_escape(db_dir)),
+    ):
+        content = content.replace(sentinel, value)
 
     with open(compose_path, "w", encoding="utf-8") as fh:
-        yaml.dump(compose_content, fh, default_flow_style=False, sort_keys=False)
+        fh.write(content)
 
     print(f"Docker Compose file created at: {compose_path}")
 
 
+def _ensure_networks(compose_path: str) -> None:
+    """
+    Best-effort pre-creation of the project's compose networks.
+
+    The only retryable `docker compose up` failure is a "network not found"
+    race; creating the network up front (idempotent, with the labels compose
+    expects so it adopts rather than rejects it) removes the race entirely.
+    Any failure here is ignored — compose will create the network itself.
+    """
+    try:
+        with open(compose_path, "r", encoding="utf-8") as fh:
+            spec = json.load(fh)
+        raw_project = os.path.basename(os.path.dirname(os.path.abspath(compose_path)))
+        project = "".join(c for c in raw_project.lower() if c.isalnum() or c in "_-").lstrip("_-")
+        for net in (spec.get("networks") or {}):
+            full_name = f"{project}_{net}"
+            inspect = subprocess.run(
+                ["docker", "network", "inspect", full_name], capture_output=True
+            )
+            if inspect.returncode != 0:
+                subprocess.run(
+                    ["docker", "network", "create", "--driver", "bridge",
+                     "--label", f"com.docker.compose.network={net}",
+                     "--label", f"com.docker.compose.project={project}",
+                     full_name],
+                    capture_output=True,
+                )
+    except Exception:
+        pass
+
+
 def start_docker_containers(compose_path: str):
     """Start Docker containers using the compose file"""
     print("Starting Docker containers...")
+    _ensure_networks(compose_path)
+    cmd = ["docker", "compose", "-f", compose_path, "up", "-d", "--remove-orphans"]
     for attempt in range(3):  # Retry up to 3 times
-        try:
-            result = subprocess.run(["docker", "compose", "-f", compose_path, "up", "-d", "--remove-orphans"], 
-                                  check=True, capture_output=True, text=True)
-            print(result)
-            
+        # stdout inherits the terminal FD so compose progress is never
+        # buffered through Python; stderr is captured so a failure can be
+        # classified from this invocation instead of re-running `up` (the
+        # classification runs on raw bytes — the needles are ASCII — and
+        # only decodes for the human-readable prints)
+        result = subprocess.run(cmd, stderr=subprocess.PIPE)
+        if result.returncode == 0:
             print("Docker containers started successfully")
             return True
-        except subprocess.CalledProcessError as e:
-            error_output = e.stderr.lower()
-            if "network" in error_output and "not found" in error_output and attempt < 2:
-                print(f"Network error on attempt {attempt + 1}, retrying in 5 seconds...")
-                print(f"Error details: {e.stderr}")
-                time.sleep(5)
-                continue
-            else:
-                print(f"Failed to start Docker containers after {attempt + 1} attempts")
-                print(f"Stderr: {e.stderr}")
-                print(f"Stdout: {e.stdout}")
-                return False
+        error_output = (result.stderr or b"").lower()
+        if b"network" in error_output and b"not found" in error_output and attempt < 2:
+            delay = 0.5 * (2 ** attempt)
+            print(f"Network error on attempt {attempt + 1}, retrying in {delay}s...")
+            print(f"Error details: {result.stderr.decode(errors='replace')}")
+            time.sleep(delay)
+            continue
+        else:
+            print(f"Failed to start Docker containers after {attempt + 1} attempts")
+            print(f"Stderr: {result.stderr.decode(errors='replace')}")
+            return False
     return False
 
 
+async def start_docker_containers_async(compose_path: str):
+    """
+    Asynchronous `docker compose up` for event-loop callers.
+
+    Runs `up -d --wait --wait-timeout 30`, so the coroutine resolves only
+    once the containers are actually running — no separate readiness poll —
+    and N sandbox startups overlap under `asyncio.gather` instead of
+    serializing on blocking subprocess.run calls.
+    """
+    import asyncio
+
+    _ensure_networks(compose_path)
+    proc = await asyncio.create_subprocess_exec(
+        "docker", "compose", "-f", compose_path,
+        "up", "-d", "--wait", "--wait-timeout", "30", "--remove-orphans",
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await proc.communicate()
+    if proc.returncode == 0:
+        return True
+    print(f"Failed to start Docker containers: {stderr.decode(errors='replace')}")
+    return False
+
+
+def start_docker_containers_batch(compose_paths):
+    """
+    Start several compose projects concurrently.
+
+    Every `docker compose up` pays its own CLI bootstrap and daemon
+    session (~seconds); launching the invocations together and collecting
+    them afterwards overlaps that cost across sessions instead of paying it
+    serially. Any project that fails the parallel attempt is retried
+    through the serial path, which handles the network-race retry.
+
+    Returns a dict mapping compose_path -> bool (started successfully).
+    """
+    procs = {}
+    for compose_path in compose_paths:
+        procs[compose_path] = subprocess.Popen(
+            ["docker", "compose", "-f", compose_path, "up", "-d", "--remove-orphans"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+
+    results = {}
+    for compose_path, proc in procs.items():
+        proc.communicate()
+        if proc.returncode == 0:
+            results[compose_path] = True
+        else:
+            # serial fallback retries transient failures one at a time
+            results[compose_path] = start_docker_containers(compose_path)
+    return results
+
+
 def stop_docker_containers(compose_path: str):
     """Stop Docker containers using the compose file"""
     print("Stopping Docker containers...")
@@ -127,21 +273,16 @@ def stop_docker_containers(compose_path: str):
         print("Docker containers stopped successfully")
         return True
     except subprocess.TimeoutExpired:
+        # re-running the identical `down` would just time out again; go
+        # straight to kill + force-remove instead of waiting another 30 s
         print("Graceful shutdown timed out, forcing stop...")
         try:
-            # Force stop if graceful shutdown fails
-            subprocess.run(["docker", "compose", "-f", compose_path, "down", "-v", "--remove-orphans"], check=True, timeout=30)
-            print("Docker containers force stopped successfully")
+            subprocess.run(["docker", "compose", "-f", compose_path, "kill"], check=True, timeout=10)
+            subprocess.run(["docker", "compose", "-f", compose_path, "rm", "--stop", "-v", "--force"], check=True, timeout=10)
+            print("Docker containers killed and removed")
             return True
-        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
-            print(f"Failed to stop Docker containers: {e}")
-            # Try to clean up any remaining containers
-            try:
-                subprocess.run(["docker", "compose", "-f", compose_path, "kill"], check=True, timeout=10)
-                subprocess.run(["docker", "compose", "-f", compose_path, "rm", "--stop", "-v", "--force"], check=True, timeout=10)
-                print("Docker containers killed and removed")
-            except Exception as cleanup_error:
-                print(f"Failed to cleanup containers: {cleanup_error}")
+        except Exception as cleanup_error:
+            print(f"Failed to cleanup containers: {cleanup_error}")
             return False
     except subprocess.CalledProcessError as e:
         print(f"Failed to stop Docker containers: {e}")
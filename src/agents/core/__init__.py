@@ -1,19 +1,37 @@
 """
 Core package for Qwen Code Python.
+
+Submodules are imported lazily (PEP 562): importing `core` for one symbol
+no longer drags in every agent subclass and its transitive dependencies.
 """
-from .tool_registry import ToolRegistry
-from .tool_error import ToolError, ToolNotFoundError, ToolExecutionError, format_tool_error
-from .system_prompt import get_core_system_prompt, get_compression_prompt
-from .info_gathering_agent import InfoGatheringAgent, InfoGatheringAgentConfig
-from .backend_testing_agent import BackendTestingAgent, BackendTestingAgentConfig
-from .compress_output import compress_output
+import importlib
+
+_LAZY_IMPORTS = {
+    "ToolRegistry": ".tool_registry",
+    "ToolError": ".tool_error",
+    "ToolNotFoundError": ".tool_error",
+    "ToolExecutionError": ".tool_error",
+    "format_tool_error": ".tool_error",
+    "get_core_system_prompt": ".system_prompt",
+    "get_compression_prompt": ".system_prompt",
+    "InfoGatheringAgent": ".info_gathering_agent",
+    "InfoGatheringAgentConfig": ".info_gathering_agent",
+    "BackendTestingAgent": ".backend_testing_agent",
+    "BackendTestingAgentConfig": ".backend_testing_agent",
+    "compress_output": ".compress_output",
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # cache so the next access skips __getattr__
+    return value
+
 
-__all__ = [
-    "ToolRegistry",
-    "ToolError",
-    "ToolNotFoundError",
-    "ToolExecutionError",
-    "format_tool_error",
-    "AgentConfig",
-    "WebGenAgent2V1"
-]
\ No newline at end of file
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
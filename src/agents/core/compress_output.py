@@ -1,5 +1,7 @@
+import hashlib
 import sys
 import os
+from collections import OrderedDict
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -40,8 +42,26 @@ def compress_backend_output(output: str, model: str) -> str:
     return compressed_output.strip()
 
 
+# Compression is itself an LLM call, and iterative agents re-run the same
+# backend test (and get byte-identical output) all the time. Keyed by a
+# digest of the content — not the content itself — so the cache holds only
+# the short compressed strings. LRU-bounded; shared by all agents in the
+# process.
+_CACHE_MAX_ENTRIES = 256
+_compression_cache: OrderedDict = OrderedDict()
+
+
 def compress_output(output: str, model: str, tool_name: str) -> str:
     if tool_name == BackendTestTool.Name and len(output) > 10000:
-            return compress_backend_output(output, model)
+        key = (model, tool_name, hashlib.blake2b(output.encode("utf-8"), digest_size=16).digest())
+        cached = _compression_cache.get(key)
+        if cached is not None:
+            _compression_cache.move_to_end(key)
+            return cached
+        compressed = compress_backend_output(output, model)
+        _compression_cache[key] = compressed
+        if len(_compression_cache) > _CACHE_MAX_ENTRIES:
+            _compression_cache.popitem(last=False)
+        return compressed
     return output
 
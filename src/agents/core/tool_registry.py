@@ -20,11 +20,13 @@ class ToolRegistry:
     def __init__(self):
         self.tools: Dict[str, 'BaseTool'] = {}
         self.allowlist: Dict[str, bool] = {}  # For tracking approved tools
-        
+        self._schema_cache: Optional[List[Dict[str, Any]]] = None
+
     def register_tool(self, tool: 'BaseTool'):
         """Register a tool in the registry."""
         self.tools[tool.name] = tool
-        
+        self._schema_cache = None  # schemas are stale until rebuilt
+
     def get_tool(self, name: str) -> Optional['BaseTool']:
         """Get a tool by name."""
         return self.tools.get(name)
@@ -34,7 +36,13 @@ class ToolRegistry:
         return list(self.tools.values())
         
     def get_tool_schemas(self) -> List[Dict[str, Any]]:
-        """Get schemas for all registered tools."""
+        """Get schemas for all registered tools.
+
+        The schema list is identical for every agent step, so it is built
+        once and served from a cache that registering a new tool invalidates.
+        """
+        if self._schema_cache is not None:
+            return self._schema_cache
         schemas = []
         for tool in self.tools.values():
             schema = tool.get_schema()
@@ -42,6 +50,7 @@ class ToolRegistry:
             if hasattr(tool, 'kind') and tool.kind:
                 schema["kind"] = tool.kind.value
             schemas.append(schema)
+        self._schema_cache = schemas
         return schemas
         
     def get_tools_by_kind(self, kind: ToolKind) -> List['BaseTool']:
@@ -2,6 +2,12 @@ import os
 from tqdm import tqdm
 import json
 
+try:
+    # C-implemented encoder for bulk result writes
+    import orjson
+except ImportError:
+    orjson = None
+
 
 PRIMARY_CATEGORIES = [
 "Content Presentation",
@@ -36,9 +42,15 @@ def load_jsonl(in_file):
 
 
 def save_jsonl(datas, out_file, mode="w"):
-    with open(out_file, mode, encoding="utf-8") as f:
-        for data in tqdm(datas):
-            f.write(json.dumps(data, ensure_ascii=False) + "\n")
+    # serialize the whole batch first and write it with one syscall
+    if orjson is not None:
+        payload = b"".join(orjson.dumps(data) + b"\n" for data in datas)
+    else:
+        payload = "".join(
+            json.dumps(data, ensure_ascii=False) + "\n" for data in datas
+        ).encode("utf-8")
+    with open(out_file, mode + "b") as f:
+        f.write(payload)
 
         
 def db_compute_acc(in_dir):
@@ -7,6 +7,12 @@ import re
 from typing import List, Tuple
 import json
 
+try:
+    # C-implemented encoder for bulk result writes
+    import orjson
+except ImportError:
+    orjson = None
+
 import subprocess
 from pathlib import Path
 import sys
@@ -68,9 +74,15 @@ def load_jsonl(in_file):
 
 
 def save_jsonl(datas, out_file, mode="w"):
-    with open(out_file, mode, encoding="utf-8") as f:
-        for data in tqdm(datas):
-            f.write(json.dumps(data, ensure_ascii=False) + "\n")
+    # serialize the whole batch first and write it with one syscall
+    if orjson is not None:
+        payload = b"".join(orjson.dumps(data) + b"\n" for data in datas)
+    else:
+        payload = "".join(
+            json.dumps(data, ensure_ascii=False) + "\n" for data in datas
+        ).encode("utf-8")
+    with open(out_file, mode + "b") as f:
+        f.write(payload)
 
 
 def get_shell_start(app_paths, output_root):